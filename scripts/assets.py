@@ -1,69 +1,250 @@
-import requests, json
-from os import path
+import requests, json, re, struct, sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from os import listdir, makedirs, path, remove, replace
+from PIL import Image, ImageChops, ImageDraw
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# The folder that assets are synchronised into.
+assets_path = "./assets"
 
 json_urls = ["https://raw.githubusercontent.com/Dimbreath/GenshinData/master/ExcelBinOutput/AvatarExcelConfigData.json",
              "https://raw.githubusercontent.com/Dimbreath/GenshinData/master/ExcelBinOutput/AvatarCostumeExcelConfigData.json",
              "https://raw.githubusercontent.com/Dimbreath/GenshinData/master/ExcelBinOutput/MaterialExcelConfigData.json"]
+images_url = "https://enka.shinshin.moe/ui"
+
+# The number of files that are downloaded at once.
+workers = 8
+# Timeouts, in seconds, for connecting to a server and reading a file from it.
+timeout = (5, 30)
+
+# The atlases of pre-resized icons built from the images, as (kind, size) pairs.
+# 'icons' are namecard icons that are only resized, and 'round' icons are avatar icons that are also cut into a circle.
+atlas_sizes = [('icons', (96, 96)), ('round', (96, 96)), ('round', (160, 160))]
+# Atlas files start with a magic number and the number of images they hold, followed by a fixed-width index.
+# Each entry of the index holds an image's name, its width and height, and the offset of its RGBA pixels in the file.
+atlas_magic = b'GPA1'
+atlas_header = struct.Struct('<4sI')
+atlas_record = struct.Struct('<48sIIQ')
 
 
 # Checks if an image exists in the assets folder.
 def check_file(file_name):
-    return path.exists(f"./assets/images/{file_name}.png")
+    return path.exists(f"{assets_path}/images/{file_name}.png")
+
+
+# Creates a session that keeps connections open between downloads and retries failed ones.
+def create_session():
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retries)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Loads the manifest of every synchronised file, keyed by its path relative to the assets folder.
+# Each entry holds the ETag and Last-Modified headers the file was downloaded with, if there were any.
+def load_manifest():
+    try:
+        with open(f"{assets_path}/manifest.json", "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+# Checks that a file is complete, raising a ValueError or OSError if it is truncated or is not the expected type.
+# JSON files are read an item at a time, so checking them takes no more memory than reading them with iter_json_array().
+def verify_file(file_type, filepath):
+    if file_type == "images":
+        with Image.open(filepath) as image:
+            if image.format != "PNG":
+                raise ValueError(f"expected a PNG, not {image.format}")
+            image.load()
+    else:
+        for empty_var in iter_json_array(filepath):
+            pass
+
+
+# Checks that a local file is complete.
+def check_local_file(file_type, file_name):
+    try:
+        verify_file(file_type, f"{assets_path}/{file_type}/{file_name}")
+    except (OSError, ValueError):
+        return False
+
+    return True
 
 
 # Downloads a file from a given URL.
 # The file is placed into a different location based on the input file type.
-def download_file(file_type, url):
-    response = requests.get(url)
-    filepath = f"./assets/{file_type}/{url.split('/')[-1]}"
-    open(filepath, "wb").write(response.content)
-
-
-# Generates a JSON file containing every character and, if any exist, their associated costumes.
-# Any assets that are not local already are downloaded.
-def generate_characters():
-    filepath = "./assets/json"
-    avatars_json = json.load(open(f"{filepath}/AvatarExcelConfigData.json", "r"))
-    costumes_json = json.load(open(f"{filepath}/AvatarCostumeExcelConfigData.json", "r"))
+# If a manifest entry is given, the file is only downloaded if it has changed since then.
+# Returns the file's new manifest entry, or None if it has not changed.
+def download_file(session, file_type, url, entry=None):
+    filepath = f"{assets_path}/{file_type}/{url.split('/')[-1]}"
+
+    headers = {}
+    if entry is not None and path.exists(filepath):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        # Files are streamed to a temporary path and checked there first, so an interrupted sync never leaves a broken
+        # file, and a file is never held in memory whole.
+        with open(f"{filepath}.tmp", "wb") as file:
+            for chunk in response.iter_content(64 * 1024):
+                file.write(chunk)
+    try:
+        verify_file(file_type, f"{filepath}.tmp")
+    except (OSError, ValueError):
+        remove(f"{filepath}.tmp")
+        raise
+    replace(f"{filepath}.tmp", filepath)
+
+    return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+
+# Downloads many files at once, recording them in the manifest.
+# files -> a list of (file_type, url) pairs.
+def sync_files(session, manifest, files):
+    with ThreadPoolExecutor(workers) as executor:
+        futures = {}
+        for file_type, url in files:
+            name = f"{file_type}/{url.split('/')[-1]}"
+            futures[executor.submit(download_file, session, file_type, url, manifest.get(name))] = name
+
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                entry = future.result()
+            except (requests.RequestException, OSError, ValueError) as error:
+                print(f"Failed to download {name}: {error}")
+                continue
+
+            if entry is not None:
+                manifest[name] = entry
+                print(name)
+
+
+# Gets the downloads needed for the given images.
+# Missing or broken images are downloaded, and images downloaded with an ETag or Last-Modified header are re-checked.
+# Existing images without either header are checked locally once and then kept, as they never change upstream.
+def get_image_downloads(image_names, manifest):
+    downloads = []
+    for image_name in sorted(image_names):
+        name = f"images/{image_name}.png"
+        entry = manifest.get(name)
+
+        if not check_file(image_name) or (entry is None and not check_local_file("images", f"{image_name}.png")):
+            downloads.append(("images", f"{images_url}/{image_name}.png"))
+        elif entry is None:
+            manifest[name] = {'etag': None, 'last_modified': None}
+        elif entry.get('etag') or entry.get('last_modified'):
+            downloads.append(("images", f"{images_url}/{image_name}.png"))
+
+    return downloads
+
+
+# Reads the items of a JSON array file one at a time, so that only a chunk of the file is held in memory at once.
+# The Excel config files grow with every game update, while only a few of their items are needed.
+def iter_json_array(filepath, chunk_size=64 * 1024):
+    decoder = json.JSONDecoder()
+    separator = re.compile(r'[\s,]*')
+
+    with open(filepath, "r", encoding="utf-8") as file:
+        # Skips any whitespace before the array.
+        buffer = ""
+        while buffer == "":
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            buffer = chunk.lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{filepath} is not a JSON array")
+        position = 1
+
+        while True:
+            # Skips the whitespace and commas between items.
+            position = separator.match(buffer, position).end()
+            if position == len(buffer):
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    raise ValueError(f"{filepath} ends before its array is closed")
+                buffer, position = chunk, 0
+                continue
+            if buffer[position] == "]":
+                return
+
+            # If the item is not complete within the buffer, more of the file is read until it is.
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                item, end = None, len(buffer)
+            if end == len(buffer):
+                chunk = file.read(chunk_size)
+                if chunk:
+                    buffer, position = buffer[position:] + chunk, 0
+                    continue
+                if item is None:
+                    raise ValueError(f"{filepath} ends before its array is closed")
+
+            yield item
+            position = end
+
+
+# Writes a JSON file to a temporary path and then renames it into place.
+# This means the running application's catalog never reads a partially written file.
+def write_json(filepath, data):
+    with open(f"{filepath}.tmp", 'w') as file:
+        json.dump(data, file, ensure_ascii=False, separators=(',', ':'))
+    replace(f"{filepath}.tmp", filepath)
+
+
+# Generates the contents of a JSON file containing every character and, if any exist, their associated costumes.
+# The names of every image that is needed are added to image_names.
+def generate_characters(image_names):
+    filepath = f"{assets_path}/json"
     characters = {}
 
-    for character in avatars_json:
+    for character in iter_json_array(f"{filepath}/AvatarExcelConfigData.json"):
         # If the avatar_id is 10000001 it is not a valid character.
         avatar_id = character['featureTagGroupID']
         if avatar_id == 10000001:
             continue
 
-        # Downloads any files that haven't already been downloaded.
         icon_name = f"{character['iconName']}"
-        if not check_file(icon_name):
-            download_file("images", f"https://enka.shinshin.moe/ui/{icon_name}.png")
+        image_names.add(icon_name)
 
         characters[avatar_id] = {'iconName': icon_name, 'costumes': {}}
 
-    for costume in costumes_json:
+    for costume in iter_json_array(f"{filepath}/AvatarCostumeExcelConfigData.json"):
         file_name = costume['FOINIGFDKIP']
         if file_name == "":
             continue
 
-        if not check_file(file_name):
-            download_file("images", f"https://enka.shinshin.moe/ui/{file_name}.png")
+        image_names.add(file_name)
 
         avatar_id = costume['FMAJGGBGKKN']
         costume_id = costume['GMECDCKBFJM']
         characters[avatar_id]['costumes'][costume_id] = {'iconName': file_name}
 
-    with open(f'{filepath}/Characters.json', 'w') as file:
-        json.dump(characters, file, ensure_ascii=False, indent=4)
+    return characters
 
 
-# Generates a JSON file containing every namecard.
-# Any assets that are not local already are downloaded.
-def generate_namecards():
-    filepath = "./assets/json"
-    materials_json = json.load(open(f"{filepath}/MaterialExcelConfigData.json", "r"))
+# Generates the contents of a JSON file containing every namecard.
+# The names of every image that is needed are added to image_names.
+def generate_namecards(image_names):
+    filepath = f"{assets_path}/json"
     namecards = {}
 
-    for material in materials_json:
+    for material in iter_json_array(f"{filepath}/MaterialExcelConfigData.json"):
         # Skip any materials that are not a namecard or have no materialType property.
         if "materialType" not in material:
             continue
@@ -74,34 +255,132 @@ def generate_namecards():
 
         icon_name = f"{material['icon']}"
         image_name = f"{material['picPath'][1]}"
-
-        if not check_file(icon_name):
-            download_file("images", f"https://enka.shinshin.moe/ui/{icon_name}.png")
-            print(icon_name)
-        if not check_file(image_name):
-            download_file("images", f"https://enka.shinshin.moe/ui/{image_name}.png")
-            print(image_name)
+        image_names.update([icon_name, image_name])
 
         material_id = material['id']
         namecards[material_id] = {'iconName': icon_name, 'imageName': image_name}
 
-    with open(f'{filepath}/Namecards.json', 'w') as file:
-        json.dump(namecards, file, ensure_ascii=False, indent=4)
+    return namecards
 
 
 # Generates JSON files used by the application by simplifying pre-existing ones.
-# Referenced assets that are not available locally are downloaded.
+# Referenced assets that are not available locally, or that have changed, are downloaded.
+# A manifest of every download is kept, so that a rerun only downloads the files that have changed.
 # Pre-existing JSONs sourced from https://github.com/Dimbreath/GenshinData/
 def generate_json():
+    session = create_session()
+    manifest = load_manifest()
+
     # Downloads any required JSON files.
-    for url in json_urls:
-        download_file("json", url)
+    sync_files(session, manifest, [("json", url) for url in json_urls])
+
+    # Generates the JSON files for characters and namecards.
+    image_names = set()
+    characters = generate_characters(image_names)
+    namecards = generate_namecards(image_names)
+
+    # The images are downloaded before the JSON files are written, so the application never refers to missing images.
+    sync_files(session, manifest, get_image_downloads(image_names, manifest))
+    write_json(f'{assets_path}/json/Characters.json', characters)
+    write_json(f'{assets_path}/json/Namecards.json', namecards)
+
+    write_json(f'{assets_path}/manifest.json', manifest)
+
+    generate_atlases()
+
+
+# Draws a circle mask in the same way as the renderer, at 3x the requested size and then resized for smoother curves.
+def draw_circle_mask(size):
+    large_size = (size[0] * 3, size[1] * 3)
+    mask = Image.new('L', large_size)
+    ImageDraw.Draw(mask).ellipse((0, 0) + large_size, fill=255, outline=255, width=0)
+
+    return mask.resize(size, resample=Image.Resampling.LANCZOS)
+
+
+# Writes a list of (name, image) pairs into an atlas file, which the application memory-maps.
+# Names longer than an index entry allows are left out, so the application decodes those images itself.
+def write_atlas(filepath, images):
+    images = [(name.encode('utf-8'), image) for name, image in images if len(name.encode('utf-8')) <= 48]
+
+    with open(f"{filepath}.tmp", "wb") as file:
+        file.write(atlas_header.pack(atlas_magic, len(images)))
+
+        offset = atlas_header.size + atlas_record.size * len(images)
+        for name, image in images:
+            file.write(atlas_record.pack(name, image.width, image.height, offset))
+            offset += image.width * image.height * 4
+
+        for name, image in images:
+            file.write(image.tobytes())
+    replace(f"{filepath}.tmp", filepath)
+
+
+# Generates the icon atlases from Characters.json, Namecards.json and the images that have been downloaded.
+# Icons are resized, and rounded where needed, once here rather than for every profile card.
+def generate_atlases():
+    with open(f"{assets_path}/json/Characters.json", "r", encoding="utf-8") as file:
+        characters = json.load(file)
+    with open(f"{assets_path}/json/Namecards.json", "r", encoding="utf-8") as file:
+        namecards = json.load(file)
+
+    icon_names = {'icons': {namecard['iconName'] for namecard in namecards.values()}, 'round': set()}
+    for character in characters.values():
+        icon_names['round'].add(character['iconName'])
+        icon_names['round'].update(costume['iconName'] for costume in character['costumes'].values())
+
+    makedirs(f"{assets_path}/atlas", exist_ok=True)
+    for kind, size in atlas_sizes:
+        mask = draw_circle_mask(size)
+
+        images = []
+        for icon_name in sorted(icon_names[kind]):
+            if not check_file(icon_name):
+                continue
+
+            with Image.open(f"{assets_path}/images/{icon_name}.png") as file:
+                icon = file.convert('RGBA').resize(size, resample=Image.Resampling.LANCZOS)
+            if kind == 'round':
+                icon.putalpha(ImageChops.darker(mask, icon.getchannel('A')))
+            images.append((icon_name, icon))
+
+        write_atlas(f"{assets_path}/atlas/{kind}_{size[0]}x{size[1]}.atlas", images)
+
+    generate_image_store()
+
+
+# Decodes every downloaded image into an atlas, which the application memory-maps when IMAGE_STORE is 'mmap' so that
+# its workers share the decoded images rather than each decoding their own.
+# Images are decoded one at a time, so building the atlas never holds more than one decoded image in memory.
+def generate_image_store():
+    names = sorted(file_name[:-4] for file_name in listdir(f"{assets_path}/images")
+                   if file_name.endswith(".png") and len(file_name[:-4].encode('utf-8')) <= 48)
+
+    # The index is written first, so the sizes of the images are read from their headers without decoding them.
+    sizes = []
+    for name in names:
+        with Image.open(f"{assets_path}/images/{name}.png") as file:
+            sizes.append(file.size)
+
+    makedirs(f"{assets_path}/atlas", exist_ok=True)
+    filepath = f"{assets_path}/atlas/images.atlas"
+    with open(f"{filepath}.tmp", "wb") as file:
+        file.write(atlas_header.pack(atlas_magic, len(names)))
+
+        offset = atlas_header.size + atlas_record.size * len(names)
+        for name, size in zip(names, sizes):
+            file.write(atlas_record.pack(name.encode('utf-8'), size[0], size[1], offset))
+            offset += size[0] * size[1] * 4
 
-    # Generates a JSON file for characters.
-    generate_characters()
-    # Generates a JSON file for namecards.
-    generate_namecards()
+        for name in names:
+            with Image.open(f"{assets_path}/images/{name}.png") as image:
+                file.write(image.convert('RGBA').tobytes())
+    replace(f"{filepath}.tmp", filepath)
 
 
+# Run with 'atlases' to only rebuild the icon atlases and image store from the assets that have already been downloaded.
 if __name__ == '__main__':
-    generate_json()
+    if sys.argv[1:] == ['atlases']:
+        generate_atlases()
+    else:
+        generate_json()
@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+
+web_app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web_app")
+
+
+# Gets the UserIDs to render from the command line and, if one is given, a file with one UserID per line.
+def get_userids(args):
+    userids = list(args.userids)
+    if args.file is not None:
+        with open(args.file, "r") as file:
+            userids += [line.strip() for line in file if line.strip()]
+
+    return userids
+
+
+# Pre-generates the profile cards of many users at once, e.g.
+# python batch.py --file userids.txt --showcase characters --output cards.tar
+# Cards are written into a directory, or a tar archive if the output ends in '.tar', alongside a manifest.json.
+def main():
+    parser = argparse.ArgumentParser(description="Renders the profile cards of many users at once.")
+    parser.add_argument("userids", nargs="*", help="the UserIDs to render")
+    parser.add_argument("--file", help="a file with one UserID per line")
+    parser.add_argument("--showcase", default="", help="'characters', 'namecards' or '' for no showcase")
+    parser.add_argument("--icon", default="", help="the icon colour, or the most dominant colour if empty")
+    parser.add_argument("--size", default="1", help="a percentage of the full card size")
+    parser.add_argument("--format", default="png", help="'png', 'png8', 'webp' or 'avif'")
+    parser.add_argument("--output", default="cards", help="a directory, or a file ending in '.tar'")
+    parser.add_argument("--processes", type=int, default=None, help="the number of renderer processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="the number of concurrent player data fetches")
+    args = parser.parse_args()
+
+    userids = get_userids(args)
+    output = os.path.abspath(args.output)
+
+    # The web application loads its assets from paths relative to its own folder.
+    os.chdir(web_app_path)
+    sys.path.insert(0, web_app_path)
+    from app.api import batch
+
+    options = {'showcase': args.showcase, 'icon': args.icon, 'size': args.size, 'format': args.format}
+    if output.endswith(".tar"):
+        output_file = open(output, "wb")
+        writer = batch.TarWriter(output_file)
+    else:
+        output_file = None
+        writer = batch.DirectoryWriter(output)
+
+    results = batch.render_batch(userids, options, args.processes, args.concurrency)
+    for result in batch.write_batch(results, writer):
+        print(f"{result['userid']}: {result['status']}")
+
+    if output_file is not None:
+        output_file.close()
+
+
+if __name__ == '__main__':
+    main()
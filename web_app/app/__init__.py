@@ -1,8 +1,75 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import Config
 
 app = Flask(__name__)
+app.config.from_object(Config)
+
+# Behind trusted proxies, each request's remote address is taken from their X-Forwarded-For headers instead.
+if app.config['PROXY_COUNT'] > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_COUNT'])
 
 from app import routes
 
 from app.api import bp as api_bp
 app.register_blueprint(api_bp, url_prefix='/api')
+
+from app.api.images import image_cache
+image_cache.resize(app.config['IMAGE_CACHE_BYTES'])
+if app.config['IMAGE_STORE'] == 'mmap':
+    image_cache.open_store(app.config['IMAGE_STORE_PATH'])
+
+from app.api.cache import create_backend, response_cache
+response_cache.backend = create_backend(app.config)
+response_cache.ttl = app.config['RESPONSE_CACHE_TTL']
+
+from app.api import encoding
+encoding.configure(app.config['ENCODING_POLICY'], app.config['NEGOTIATED_FORMATS'])
+
+from app.api.static import static_files
+static_files.max_age = app.config['STATIC_MAX_AGE']
+static_files.load(app)
+
+from app.api import tiers
+tiers.configure(app.config['SIZE_TIERS'], app.config['SIZE_MODE'], app.config['SIZE_LADDER'])
+
+from app.api.enka import enka_client
+enka_client.url = app.config['ENKA_URL']
+enka_client.connect_timeout = app.config['ENKA_CONNECT_TIMEOUT']
+enka_client.read_timeout = app.config['ENKA_READ_TIMEOUT']
+enka_client.retries = app.config['ENKA_RETRIES']
+enka_client.backoff = app.config['ENKA_BACKOFF']
+enka_client.max_backoff = app.config['ENKA_MAX_BACKOFF']
+enka_client.pool_size = app.config['ENKA_POOL_SIZE']
+
+from app.api.players import player_cache
+player_cache.default_ttl = app.config['PLAYER_CACHE_TTL']
+player_cache.stale_ttl = app.config['PLAYER_STALE_TTL']
+player_cache.missing_ttl = app.config['PLAYER_MISSING_TTL']
+player_cache.retry_interval = app.config['PLAYER_RETRY_INTERVAL']
+
+from app.api.admission import admission, create_buckets
+admission.buckets = create_buckets(app.config)
+admission.ip_rate = app.config['ADMISSION_IP_RATE']
+admission.ip_burst = app.config['ADMISSION_IP_BURST']
+admission.uid_rate = app.config['ADMISSION_UID_RATE']
+admission.uid_burst = app.config['ADMISSION_UID_BURST']
+admission.max_renders = app.config['ADMISSION_MAX_RENDERS']
+
+from app.api.warmer import TopK, warmer
+warmer.enabled = app.config['WARMER']
+warmer.top = TopK(app.config['WARMER_TOP'])
+warmer.interval = app.config['WARMER_INTERVAL']
+warmer.processes = app.config['WARMER_PROCESSES']
+warmer.ttl = app.config['RESPONSE_CACHE_TTL']
+warmer.replay_path = app.config['WARMER_REPLAY_LOG']
+
+from app.api.metrics import metrics
+metrics.enabled = app.config['METRICS']
+
+from app.api import profiles
+from app.api.catalog import catalog
+profiles.base_layers.resize(app.config['BASE_LAYER_CACHE_BYTES'])
+catalog.listeners.append(profiles.clear)
+profiles.warm_sprites()
+profiles.warm_colours()
@@ -2,4 +2,5 @@ from flask import Blueprint
 
 bp = Blueprint('api', __name__)
 
-from app.api import assets, profiles
\ No newline at end of file
+from app.api import (admission, assets, atlas, batch, cache, cards, catalog, encoding, enka, fonts, imageops, images,
+                     metrics, players, profiles, sprites, static, tiers, timing, warmer)
@@ -0,0 +1,223 @@
+import math
+import threading
+import time
+from app.api.cache import FakeRedis
+
+
+# Raised when a request is refused, with how long, in seconds, the client should wait before trying again.
+# status -> 429 if the client or UserID is over its rate limit, or 503 if the server is rendering too many cards.
+class AdmissionError(Exception):
+    def __init__(self, status, retry_after):
+        super().__init__(status, retry_after)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+# Takes a token from a bucket using the generic cell rate algorithm.
+# Each bucket only stores the time at which it will be full again, which behaves exactly like a bucket of 'burst'
+# tokens refilled every 'interval' seconds.
+# full_at -> the time at which the bucket is full again, or None for a bucket that has never been used.
+# Returns the bucket's new full_at and 0 if there was a token, or None and the seconds until there is one otherwise.
+def take_token(full_at, now, interval, burst):
+    full_at = max(now if full_at is None else full_at, now) + interval
+    if full_at - now > burst * interval:
+        return None, full_at - now - burst * interval
+    return full_at, 0
+
+
+# Token buckets kept in this process.
+# clock -> the time source, which can be replaced to step through time in tests.
+class MemoryBuckets:
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+
+        # _buckets -> {key: the time at which the bucket is full again}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    # Takes a token from a bucket, returning 0 if there was one, or how many seconds until there is one otherwise.
+    def take(self, key, rate, burst):
+        now = self.clock()
+
+        with self._lock:
+            full_at, retry_after = take_token(self._buckets.get(key), now, 1 / rate, burst)
+            if full_at is None:
+                return retry_after
+            self._buckets[key] = full_at
+
+            # Full buckets are occasionally pruned so that the buckets do not grow forever.
+            self._takes += 1
+            if self._takes % 1024 == 0:
+                self._buckets = {key: full_at for key, full_at in self._buckets.items() if full_at > now}
+
+        return 0
+
+
+# Token buckets shared by every node through Redis, using the same algorithm as take_token().
+# Each take runs as a script on the server, so concurrent requests from different nodes cannot both take the last token.
+# The nodes' clocks are used, so they should be kept in sync, e.g. with NTP.
+# clock -> the time source, which can be replaced to step through time in tests.
+class RedisBuckets:
+    script = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tolerance = interval * tonumber(ARGV[3])
+local full_at = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now) + interval
+if full_at - now > tolerance then
+    return tostring(full_at - now - tolerance)
+end
+redis.call('SET', KEYS[1], tostring(full_at), 'PX', math.ceil((full_at - now) * 1000))
+return '0'
+"""
+
+    def __init__(self, client, prefix="genshinprofile:bucket:", clock=time.time):
+        self.client = client
+        self.prefix = prefix
+        self.clock = clock
+
+    def take(self, key, rate, burst):
+        return float(self.client.eval(self.script, 1, self.prefix + key, self.clock(), 1 / rate, burst))
+
+    # Runs the script on a FakeRedis, which cannot run Lua, with take_token().
+    @staticmethod
+    def run_script(client, keys, args):
+        now, interval, burst = (float(arg) for arg in args)
+        value = client.get(keys[0])
+
+        full_at, retry_after = take_token(None if value is None else float(value), now, interval, burst)
+        if full_at is None:
+            return str(retry_after)
+        client.set(keys[0], str(full_at), px=math.ceil((full_at - now) * 1000))
+        return '0'
+
+
+FakeRedis.scripts[RedisBuckets.script] = RedisBuckets.run_script
+
+
+# Runs identical work once when it is requested by several threads at the same time.
+# The first thread runs it, while the others wait for its result, or its exception, instead of repeating it.
+class Coalescer:
+    def __init__(self):
+        self.coalesced = 0
+
+        # _flights -> {key: [threading.Event, result, exception]} for all work currently in flight.
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    # Runs a function for a key, or waits for it if it is already running for the same key.
+    # Returns its result and whether it was run by another thread.
+    def run(self, key, function):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = [threading.Event(), None, None]
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight[0].wait()
+            if flight[2] is not None:
+                raise flight[2]
+            return flight[1], True
+
+        try:
+            flight[1] = function()
+        except Exception as error:
+            flight[2] = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight[0].set()
+
+        return flight[1], False
+
+
+# Decides whether /genshin requests are served, so that bursts of requests cannot each cause a render.
+# - Every client IP has a token bucket for its requests, and every UserID has one for the cards rendered for it.
+# - No more than max_renders cards are rendered at once by this process.
+# - Identical requests that arrive while their card is being rendered wait for that render.
+# A rate or max_renders of 0 turns that limit off.
+class AdmissionControl:
+    def __init__(self, buckets=None, ip_rate=0, ip_burst=1, uid_rate=0, uid_burst=1, max_renders=0):
+        self.buckets = buckets if buckets is not None else MemoryBuckets()
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.uid_rate = uid_rate
+        self.uid_burst = uid_burst
+        self.max_renders = max_renders
+
+        self.limited = 0
+        self.overloaded = 0
+        self.in_flight = 0
+
+        self.coalescer = Coalescer()
+        self._lock = threading.Lock()
+
+    # Takes a token from a bucket, raising a 429 AdmissionError if it is empty.
+    def _take(self, key, rate, burst):
+        if rate <= 0:
+            return
+
+        retry_after = self.buckets.take(key, rate, burst)
+        if retry_after > 0:
+            self.limited += 1
+            raise AdmissionError(429, retry_after)
+
+    # Checks a client's request against its IP's rate limit, before anything is done for it.
+    def admit(self, ip):
+        self._take(f"ip:{ip}", self.ip_rate, self.ip_burst)
+
+    # Renders a card that is not cached, with the given function.
+    # Identical requests share one render, which is checked against the UserID's rate limit and the render cap.
+    # Returns the card and whether it was rendered for another request.
+    def render(self, userid, key, function):
+        return self.coalescer.run(key, lambda: self._render(userid, function))
+
+    def _render(self, userid, function):
+        self._take(f"uid:{userid}", self.uid_rate, self.uid_burst)
+
+        if not self.acquire():
+            self.overloaded += 1
+            raise AdmissionError(503, 1)
+
+        try:
+            return function()
+        finally:
+            self.release()
+
+    # Takes a render slot, e.g. for work done in the background, returning False if every slot is in use.
+    # A slot that was taken must be given back with release().
+    def acquire(self):
+        with self._lock:
+            if 0 < self.max_renders <= self.in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        return {'limited': self.limited,
+                'overloaded': self.overloaded,
+                'coalesced': self.coalescer.coalesced,
+                'in_flight': self.in_flight}
+
+
+# Creates the token buckets of the admission control from the application's configuration.
+def create_buckets(config):
+    if config['ADMISSION_STORE'] == 'redis':
+        # Redis is only required when it is used as a store.
+        import redis
+        return RedisBuckets(redis.Redis.from_url(config['ADMISSION_REDIS_URL']))
+    if config['ADMISSION_STORE'] == 'fakeredis':
+        return RedisBuckets(FakeRedis())
+
+    return MemoryBuckets()
+
+
+admission = AdmissionControl()
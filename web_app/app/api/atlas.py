@@ -0,0 +1,120 @@
+import mmap
+import struct
+import threading
+import time
+from os import path
+from PIL import Image
+
+
+# Atlas files start with a magic number and the number of images they hold, followed by a fixed-width index.
+# Each entry of the index holds an image's name, its width and height, and the offset of its RGBA pixels in the file.
+# These are written by assets.generate_atlases() and assets.generate_image_store().
+magic = b'GPA1'
+header = struct.Struct('<4sI')
+record = struct.Struct('<48sIIQ')
+
+
+# A memory-mapped file of decoded RGBA images.
+# Images are read straight from the mapped file, so workers on the same host share its pages rather than copies.
+class Atlas:
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.mtime = path.getmtime(filepath)
+
+        with open(filepath, 'rb') as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic_number, count = header.unpack_from(self._data, 0)
+        if magic_number != magic:
+            raise ValueError(f"{filepath} is not an atlas")
+
+        self._index = {}
+        for slot in range(0, count):
+            name, width, height, offset = record.unpack_from(self._data, header.size + record.size * slot)
+            self._index[name.rstrip(b'\0').decode('utf-8')] = ((width, height), offset)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    # Gets a read-only image backed by the atlas, or None if the image is not in the atlas.
+    # The image shares the atlas' memory without copying it. Pillow copies it before any change, e.g. putalpha().
+    def get(self, name):
+        entry = self._index.get(name)
+        if entry is None:
+            return None
+
+        size, offset = entry
+        data = memoryview(self._data)[offset:offset + size[0] * size[1] * 4]
+        return Image.frombuffer('RGBA', size, data, 'raw', 'RGBA', 0, 1)
+
+
+# The atlases in a folder, which are opened the first time they are needed and reopened whenever they are rebuilt.
+# Missing or unreadable atlases are skipped, so callers fall back to decoding the images themselves.
+class AtlasStore:
+    def __init__(self, filepath="./app/api/assets/atlas", check_interval=1.0):
+        self.filepath = filepath
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._next_check = 0
+        self._atlases = {}
+
+    # Opens an atlas, returning None if it cannot be read.
+    def _open(self, name):
+        try:
+            return Atlas(f"{self.filepath}/{name}.atlas")
+        except (OSError, ValueError, struct.error):
+            return None
+
+    # Forgets any atlases that have been rebuilt or removed since they were opened, so they are opened again.
+    # The files are only checked once every check_interval seconds.
+    def refresh(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+
+        with self._lock:
+            for name, atlas in list(self._atlases.items()):
+                try:
+                    mtime = path.getmtime(f"{self.filepath}/{name}.atlas")
+                except OSError:
+                    mtime = None
+                if atlas is None or atlas.mtime != mtime:
+                    del self._atlases[name]
+
+    # Gets an atlas by its name, e.g. 'round_96x96', or None if it has not been built.
+    def get_atlas(self, name):
+        self.refresh()
+
+        atlas = self._atlases.get(name, False)
+        if atlas is False:
+            with self._lock:
+                atlas = self._atlases.get(name, False)
+                if atlas is False:
+                    atlas = self._atlases[name] = self._open(name)
+
+        return atlas
+
+    # Gets an icon of the given kind and size from its atlas, or None if it is not in one.
+    # kind -> 'icons' for resized icons or 'round' for icons that are also cut into a circle.
+    def get_icon(self, kind, name, size):
+        atlas = self.get_atlas(f"{kind}_{size[0]}x{size[1]}")
+        return None if atlas is None else atlas.get(name)
+
+
+atlases = AtlasStore()
+
+
+# Opens the atlas of every decoded image in the images folder, which is built by assets.generate_image_store().
+# Returns None if it has not been built, in which case the images are decoded by each worker instead.
+# With a preloading server, e.g. 'gunicorn --preload', the atlas is mapped once in the master process and every forked
+# worker shares the same pages.
+def load_image_store(filepath):
+    try:
+        return Atlas(filepath)
+    except (OSError, ValueError, struct.error):
+        return None
@@ -0,0 +1,222 @@
+import hmac
+import json
+import os
+import tarfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from io import BytesIO
+from flask import Response, current_app, request, jsonify
+from app.api import bp, cards, encoding
+from app.api.cache import response_cache
+from app.api.cards import CardError
+from app.api.players import player_cache
+
+
+# Gets a user's data and checks it can be used to generate their card.
+# options -> the 'showcase', 'icon', 'size' and 'format' parameters shared by every card in the batch.
+# Returns the status of the user alongside their card's parameters and data.
+def fetch_card(userid, options):
+    try:
+        params = cards.parse_args(dict(options, userid=userid))
+    except CardError:
+        return 'invalid', None, None
+
+    user_data = player_cache.get(userid)
+    try:
+        cards.check_user_data(params, user_data)
+    except CardError:
+        return 'not_found', None, None
+
+    return 'ok', params, user_data
+
+
+# Renders the cards of many users at once, yielding each result as soon as it is ready.
+# Player data is fetched by up to 'concurrency' threads, and cards are rendered across 'processes' processes.
+# The renderer processes load the shared assets once, when they start, and reuse them for the whole batch.
+# renderer -> a pool of renderer processes to use instead of starting one for this batch, e.g. from get_renderer().
+# Each result is a dictionary with the 'userid', its 'status' and, if it was rendered, its 'etag', 'format' and 'data'.
+def render_batch(userids, options, processes=None, concurrency=8, renderer=None):
+    renderer_context = nullcontext(renderer) if renderer is not None else \
+        ProcessPoolExecutor(processes, initializer=cards.init_renderer)
+    with ThreadPoolExecutor(concurrency) as fetcher, renderer_context as renderer:
+        tasks = {fetcher.submit(fetch_card, userid, options): ('fetch', userid, None, None) for userid in userids}
+
+        pending = set(tasks)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                task, userid, key, fmt = tasks.pop(future)
+
+                if task == 'render':
+                    try:
+                        data = future.result()
+                    except Exception as error:
+                        yield {'userid': userid, 'status': 'error', 'error': str(error)}
+                        continue
+
+                    response_cache.set(key, key, encoding.mimetypes[fmt], data)
+                    yield {'userid': userid, 'status': 'ok', 'etag': key, 'format': fmt, 'data': data}
+                    continue
+
+                # Invalid UserIDs and users without any player data are reported, but do not stop the batch.
+                try:
+                    status, params, user_data = future.result()
+                except Exception as error:
+                    yield {'userid': userid, 'status': 'error', 'error': str(error)}
+                    continue
+                if status != 'ok':
+                    yield {'userid': userid, 'status': status}
+                    continue
+
+                # Cards that are already cached for the user's current data are not rendered again.
+                key = cards.get_card_key(params, user_data)
+                cached_image = response_cache.get(key)
+                if cached_image is not None:
+                    yield {'userid': userid, 'status': 'ok', 'etag': key, 'format': params['format'],
+                           'data': cached_image[2]}
+                    continue
+
+                future = renderer.submit(cards.render_card, cards.get_render_args(params, user_data), params['format'])
+                tasks[future] = ('render', userid, key, params['format'])
+                pending.add(future)
+
+
+# Writes a batch's cards into a directory, alongside a manifest.json of every user's status.
+class DirectoryWriter:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, name, data):
+        # Files are written to a temporary path first so that a partially written card is never left behind.
+        with open(f"{self.path}/{name}.tmp", 'wb') as file:
+            file.write(data)
+        os.replace(f"{self.path}/{name}.tmp", f"{self.path}/{name}")
+
+    def close(self):
+        pass
+
+
+# Writes a batch's cards into a tar archive, alongside a manifest.json of every user's status.
+# The archive is written as a stream, so it can be sent to a client while the batch is still rendering.
+class TarWriter:
+    def __init__(self, fileobj):
+        self.archive = tarfile.open(fileobj=fileobj, mode='w|')
+
+    def write(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.archive.addfile(info, BytesIO(data))
+
+    def close(self):
+        self.archive.close()
+
+
+# Writes the results of render_batch() with the given writer, finishing with the manifest.
+# Yields every result as it is written, with its card data removed.
+def write_batch(results, writer):
+    manifest = []
+    for result in results:
+        data = result.pop('data', None)
+        if data is not None:
+            result['file'] = f"{result['userid']}.{encoding.extensions[result['format']]}"
+            result['bytes'] = len(data)
+            writer.write(result['file'], data)
+
+        manifest.append(result)
+        yield result
+
+    writer.write('manifest.json', json.dumps(manifest, indent=4).encode('utf-8'))
+    writer.close()
+
+
+# A file-like object that holds written data until it is taken, used to stream an archive in chunks.
+class ChunkBuffer:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+# The renderer processes shared by every /api/batch request of this worker, which are started by the first batch.
+renderer_pool = None
+renderer_lock = threading.Lock()
+
+# Held while a batch is being rendered, as each worker only renders one batch at a time.
+batch_lock = threading.Lock()
+
+
+# Gets the worker's shared pool of renderer processes, starting it if needed.
+def get_renderer(processes):
+    global renderer_pool
+
+    with renderer_lock:
+        if renderer_pool is None:
+            renderer_pool = ProcessPoolExecutor(processes, initializer=cards.init_renderer)
+        return renderer_pool
+
+
+# Checks that a request is allowed to start a batch, as batches are turned off unless BATCH_API is on and the request
+# has the BATCH_TOKEN as a bearer token.
+def is_authorised(config, authorization):
+    token = config['BATCH_TOKEN']
+    if not config['BATCH_API'] or not token or not authorization.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(authorization[len('Bearer '):].encode('utf-8'), token.encode('utf-8'))
+
+
+# Renders the cards of many users and streams them back as a tar archive with a manifest.json.
+# The request must be authorised with the BATCH_TOKEN, e.g. 'Authorization: Bearer <token>'.
+# Takes a JSON body with the following keys:
+# userids -> a list of Genshin Impact UserIDs.
+# showcase, icon, size, format -> the same parameters as /genshin, used for every card. PNG is used by default.
+@bp.route('/batch', methods=['POST'])
+def post_batch():
+    if not current_app.config['BATCH_API']:
+        return jsonify({'error': "Batches are turned off."}), 404
+    if not is_authorised(current_app.config, request.headers.get('Authorization', '')):
+        return jsonify({'error': "A valid batch token is required."}), 401
+
+    body = request.get_json(silent=True) or {}
+    userids = body.get('userids')
+    if not isinstance(userids, list) or not userids:
+        return jsonify({'error': "'userids' must be a non-empty list."}), 400
+    if len(userids) > current_app.config['BATCH_MAX_USERIDS']:
+        return jsonify({'error': f"At most {current_app.config['BATCH_MAX_USERIDS']} userids can be rendered."}), 400
+
+    userids = [str(userid) for userid in userids]
+    options = {name: str(body[name]) for name in ['showcase', 'icon', 'size', 'format'] if name in body}
+    try:
+        cards.parse_args(dict(options, userid='000000000'))
+    except CardError:
+        return jsonify({'error': "'showcase', 'size' and 'format' must be valid /genshin parameters."}), 400
+    concurrency = current_app.config['BATCH_CONCURRENCY']
+
+    # Only one batch is rendered at a time, so batches cannot take over the worker.
+    if not batch_lock.acquire(blocking=False):
+        return jsonify({'error': "A batch is already being rendered, please try again later."}), 429, \
+            {'Retry-After': '10'}
+    renderer = get_renderer(current_app.config['BATCH_PROCESSES'])
+
+    def generate():
+        buffer = ChunkBuffer()
+        results = render_batch(userids, options, concurrency=concurrency, renderer=renderer)
+        for empty_var in write_batch(results, TarWriter(buffer)):
+            yield buffer.take()
+        yield buffer.take()
+
+    # The batch is finished once the server closes the response, even if the client disconnected part way through.
+    response = Response(generate(), mimetype='application/x-tar',
+                        headers={'Content-Disposition': 'attachment; filename="cards.tar"'})
+    response.call_on_close(batch_lock.release)
+    return response
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+# The playerInfo fields that are used when generating a profile card.
+# Any change to these fields changes the card, so they are included in the cache key.
+player_fields = ['nickname', 'signature', 'level', 'towerFloorIndex', 'towerLevelIndex', 'finishAchievementNum',
+                 'nameCardId', 'profilePicture', 'showAvatarInfoList', 'showNameCardIdList']
+
+
+# Gets a hash of the playerInfo fields used to generate a profile card.
+def get_fingerprint(user_data):
+    fields = {field: user_data[field] for field in player_fields if field in user_data}
+
+    # Only the IDs of showcased characters are drawn, so their levels are ignored.
+    if 'showAvatarInfoList' in fields:
+        fields['showAvatarInfoList'] = [[data.get('avatarId'), data.get('costumeId')]
+                                        for data in fields['showAvatarInfoList']]
+
+    fields = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(fields.encode('utf-8')).hexdigest()
+
+
+# Gets the cache key of a profile card from its normalised parameters and the user's data.
+# generation -> the asset catalog's generation, so cards are re-rendered after the assets are updated.
+# fmt -> the output format of the card.
+def get_key(userid, showcase, bg_colour, size, user_data, generation=0, fmt='png'):
+    # Invalid icon colours all fall back to the most dominant colour, so they share a key.
+    if not re.search(r'^#(?:[0-9a-fA-F]{3}){1,2}$', bg_colour):
+        bg_colour = ''
+
+    query = f"{userid}|{showcase}|{bg_colour.lower()}|{size:g}|{generation}|{fmt}"
+    return hashlib.sha1(f"{query}|{get_fingerprint(user_data)}".encode('utf-8')).hexdigest()
+
+
+# An in-process cache backend that evicts the least recently used entries once it is over its byte budget.
+class MemoryBackend:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            # Expired entries are removed when they are next requested.
+            if entry[0] <= time.time():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.time() + ttl, value)
+            self.current_bytes += len(value)
+
+            while self.current_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        empty_var, value = self._entries.pop(key)
+        self.current_bytes -= len(value)
+
+
+# A cache backend that stores entries as files in a directory, so they are shared between workers.
+# Each file begins with its expiry time. The least recently used files are removed once it is over its byte budget.
+class DiskBackend:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._current_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _path(self, key):
+        return f"{self.directory}/{key}.cache"
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as file:
+                expiry = float(file.readline())
+                value = file.read()
+        except (OSError, ValueError):
+            return None
+
+        if expiry <= time.time():
+            self.delete(key)
+            return None
+
+        # Updates the access time so that the file is treated as recently used.
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+        return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+
+        # Files are written to a temporary path first so that readers never see a partial entry.
+        temp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(f"{time.time() + ttl}\n".encode('ascii'))
+            file.write(value)
+        os.replace(temp_path, self._path(key))
+
+        with self._lock:
+            self._current_bytes += len(value)
+            if self._current_bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    # Removes the least recently used files until the directory is under its budget.
+    def _evict(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.cache')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+
+        self._current_bytes = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self._current_bytes <= self.max_bytes:
+                break
+            try:
+                self._current_bytes -= entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+# A cache backend for any client with a Redis-compatible get/set/delete interface.
+# Entries expire through Redis itself, and its byte budget is set by the server's maxmemory policy.
+class RedisBackend:
+    def __init__(self, client, prefix="genshinprofile:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+# A local stand-in for a Redis client, used for testing and for running without a Redis server.
+# Only the commands used by this application are implemented.
+class FakeRedis:
+    # Lua cannot be run here, so every script used with eval() needs a Python equivalent registered in 'scripts'.
+    # scripts -> {script: function(client, keys, args)}, which is run while no other command can run, as in Redis.
+    scripts = {}
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.RLock()
+
+    def _get_entry(self, key):
+        entry = self._values.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= time.time():
+            del self._values[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._get_entry(key)
+            return None if entry is None else entry[1]
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        with self._lock:
+            if nx and self._get_entry(key) is not None:
+                return None
+
+            if isinstance(value, str):
+                value = value.encode('utf-8')
+            elif isinstance(value, (int, float)):
+                value = str(value).encode('ascii')
+
+            if px is not None:
+                ex = px / 1000
+            self._values[key] = (None if ex is None else time.time() + ex, value)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._values.pop(key, None) is not None for key in keys)
+
+    def eval(self, script, numkeys, *keys_and_args):
+        function = self.scripts.get(script)
+        if function is None:
+            raise NotImplementedError("FakeRedis has no Python equivalent of this script.")
+
+        with self._lock:
+            return function(self, list(keys_and_args[:numkeys]), list(keys_and_args[numkeys:]))
+
+
+# A cache of rendered profile cards. Each entry holds the card's ETag, MIME type and encoded bytes.
+class ResponseCache:
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+    # Gets a cached card as an (etag, mimetype, data) tuple, or None if it is not cached.
+    def get(self, key):
+        value = self.backend.get(key) if self.backend is not None else None
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        etag, mimetype, data = value.split(b'\n', 2)
+        return etag.decode('ascii'), mimetype.decode('ascii'), data
+
+    def set(self, key, etag, mimetype, data):
+        if self.backend is not None:
+            self.backend.set(key, b'\n'.join([etag.encode('ascii'), mimetype.encode('ascii'), data]), self.ttl)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+# Creates the response cache's backend from the application's configuration.
+def create_backend(config):
+    backend = config['RESPONSE_CACHE']
+    if backend == 'memory':
+        return MemoryBackend(config['RESPONSE_CACHE_BYTES'])
+    if backend == 'disk':
+        return DiskBackend(config['RESPONSE_CACHE_DIR'], config['RESPONSE_CACHE_BYTES'])
+    if backend == 'redis':
+        # Redis is only required when it is used as a backend.
+        import redis
+        return RedisBackend(redis.Redis.from_url(config['RESPONSE_CACHE_REDIS_URL']))
+    if backend == 'fakeredis':
+        return RedisBackend(FakeRedis())
+
+    return None
+
+
+response_cache = ResponseCache(None, 0)
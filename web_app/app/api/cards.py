@@ -0,0 +1,222 @@
+from PIL import Image
+from app.api import cache, encoding, profiles, tiers
+from app.api.catalog import catalog
+from app.api.timing import null_timer
+
+
+# Raised when a profile card cannot be generated, in which case the error image for the showcase is sent instead.
+# permanent -> whether the request can never succeed, e.g. invalid parameters, rather than the user's data being
+# missing, which may change later.
+class CardError(Exception):
+    def __init__(self, showcase, permanent=True):
+        super().__init__(showcase)
+        self.showcase = showcase
+        self.permanent = permanent
+
+
+# Checks and normalises the parameters of a profile card request:
+# userid -> the user's Genshin Impact UserID.
+# showcase -> 'characters' or 'namecards' or '' for the type of showcase the user wants.
+# icon -> the colour the user wants to use for their main icon, this is set to the most dominant colour if empty.
+# size -> a percentage of the full card size. It is snapped to the next larger size tier if the tiers are snapped to.
+# format -> 'png', 'png8', 'webp' or 'avif'. If it is empty, the format is picked from the Accept header.
+# Raises a CardError if any of the parameters are invalid.
+def parse_args(args, accept=''):
+    userid = args.get('userid', '')
+    showcase = args.get('showcase', '')
+    bg_colour = args.get('icon', '')
+    size = args.get('size', '1')
+    fmt = args.get('format', '')
+
+    # If the showcase's value is not valid, the user is redirected elsewhere.
+    if showcase not in ['characters', 'namecards', '']:
+        raise CardError('')
+    # If an invalid userid is entered, the user is redirected elsewhere.
+    if len(userid) != 9 or not userid.isnumeric():
+        raise CardError(showcase)
+    # Converts the size to a float if it is possible.
+    try:
+        size = float(size)
+    except ValueError:
+        raise CardError(showcase)
+    if size > 1 or size <= 0:
+        raise CardError(showcase)
+    size = tiers.get_served_size(size)
+    # If the requested format cannot be encoded, the user is redirected elsewhere.
+    fmt = encoding.negotiate(fmt, accept)
+    if fmt is None:
+        raise CardError(showcase)
+
+    # Adds a hashtag to the input colour value.
+    bg_colour = "#" + bg_colour
+
+    return {'userid': userid, 'showcase': showcase, 'bg_colour': bg_colour, 'size': size, 'format': fmt}
+
+
+# Checks that a user's data has everything needed to generate their profile card.
+def check_user_data(params, user_data):
+    # If the user does not exist, the user is redirected elsewhere.
+    if user_data is None:
+        raise CardError(params['showcase'], False)
+    # Grabs the player's user icon and namecard names.
+    if 'avatarId' not in user_data['profilePicture'] or 'nameCardId' not in user_data:
+        raise CardError(params['showcase'], False)
+
+
+# Gets the cache key, which is also the ETag, of a profile card.
+def get_card_key(params, user_data):
+    return cache.get_key(params['userid'], params['showcase'], params['bg_colour'], params['size'], user_data,
+                         catalog.generation, params['format'])
+
+
+# Gets the filename required for images based on their file type and IDs.
+# Names are resolved from the in-memory asset catalog rather than reading the JSONs on every request.
+def get_filename(f_type, f_ids, i_type):
+    return catalog.get_names(f_type, f_ids, i_type)
+
+
+# Gets the arguments for profiles.generate_profile() from the request parameters and the user's data.
+# The catalog lookups are timed as the 'lookup' stage.
+def get_render_args(params, user_data, timer=null_timer):
+    user_icon = user_data['profilePicture']
+    user_icon['avatarId'] = [str(user_icon['avatarId'])]
+
+    # The icon for a skin is used if the user is using a skin in their icon.
+    if 'costumeId' in user_icon:
+        user_icon['avatarId'].append(str(user_icon['costumeId']))
+
+    with timer.stage('lookup'):
+        user_icon = get_filename('characters', [user_icon['avatarId']], "icon")[0]
+        namecard = get_filename('namecards', [[str(user_data['nameCardId'])]], "image")[0]
+
+    # Gets the showcase icon names based on the input showcase type.
+    showcase = (params['showcase'], [])
+    if not showcase[0] == "":
+        if showcase[0] == "namecards":
+            if "showNameCardIdList" in user_data:
+                showcase_list = user_data["showNameCardIdList"]
+                for count, data in enumerate(showcase_list):
+                    showcase_list[count] = [str(data)]
+            else:
+                showcase_list = []
+        if showcase[0] == "characters":
+            if "showAvatarInfoList" in user_data:
+                showcase_list = user_data["showAvatarInfoList"]
+                for count, data in enumerate(showcase_list):
+                    showcase_list[count] = [str(data['avatarId'])]
+                    if 'costumeId' in data:
+                        showcase_list[count].append(str(data['costumeId']))
+            else:
+                showcase_list = []
+
+        with timer.stage('lookup'):
+            showcase = (showcase[0], get_filename(showcase[0], showcase_list, "icon"))
+
+    # If the following values aren't defined, they are replaced with a placeholder value.
+    user_info = {'username': '?',
+                 'signature': '(No signature)',
+                 'rank': '?',
+                 'abyss': '?',
+                 'achievements': '?'}
+    if 'nickname' in user_data:
+        user_info['username'] = user_data['nickname']
+    if 'signature' in user_data:
+        user_info['signature'] = user_data['signature']
+    if 'level' in user_data:
+        user_info['rank'] = str(user_data['level'])
+    if 'towerFloorIndex' in user_data:
+        user_info['abyss'] = str(user_data['towerFloorIndex']) + "-" + str(user_data['towerLevelIndex'])
+    if 'finishAchievementNum' in user_data:
+        user_info['achievements'] = str(user_data['finishAchievementNum'])
+
+    return user_info, user_icon, namecard, showcase, params['bg_colour'], params['size']
+
+
+# Gets the cache keys of the smaller size tiers of a card, which are rendered alongside it if the ladder is on.
+# These must be found before get_render_args() is called, as it changes the user's data.
+# Returns a list of (size, key) for the tiers.
+def get_ladder_keys(params, user_data):
+    return [(tier, get_card_key(dict(params, size=tier), user_data)) for tier in tiers.get_ladder(params['size'])]
+
+
+# Gets the parameters of the tier card that a request's card is resized from, alongside that tier, if any.
+def get_tier_params(params):
+    tier = tiers.get_source_tier(params['size'])
+    if tier is None:
+        return params, None
+    return dict(params, size=tier), tier
+
+
+# Resizes a card drawn at a size tier to a smaller size, with the same dimensions it would have if drawn at that size.
+def resize_card(image, tier, size):
+    p_size = (round(image.size[0] / tier), round(image.size[1] / tier))
+    return image.resize((int(p_size[0] * size), int(p_size[1] * size)), resample=Image.Resampling.LANCZOS)
+
+
+# Draws a profile card from the arguments given by get_render_args().
+# Sizes between the tiers are drawn at the next larger tier and resized, so only the tiers' base layers are cached.
+def draw_card(render_args, timer=null_timer):
+    size = render_args[-1]
+    tier = tiers.get_tier(size)
+    if tier is None or tier == size:
+        return profiles.generate_profile(*render_args, timer=timer)
+
+    image = profiles.generate_profile(*render_args[:-1], tier, timer=timer)
+    with timer.stage('resize'):
+        return resize_card(image, tier, size)
+
+
+# Renders a profile card from the arguments given by get_render_args() and encodes it in the given format.
+# This only depends on its arguments, so it can be run in a separate renderer process.
+def render_card(render_args, fmt='png', timer=null_timer):
+    image = draw_card(render_args, timer)
+
+    with timer.stage('encode'):
+        return encoding.encode(image, fmt)
+
+
+# Renders a card at a size between the tiers alongside the card of its tier, from a single drawing of the tier.
+# The card is resized from the drawn image rather than a decoded one, so it is the same card render_card() gives.
+# Returns the card's data and the tier's data, which is None if encode_tier is False, e.g. if it is already cached.
+def render_derived(render_args, fmt='png', encode_tier=True, timer=null_timer):
+    size = render_args[-1]
+    tier = tiers.get_tier(size)
+    image = profiles.generate_profile(*render_args[:-1], tier, timer=timer)
+
+    with timer.stage('encode'):
+        tier_data = encoding.encode(image, fmt) if encode_tier else None
+    with timer.stage('resize'):
+        image = resize_card(image, tier, size)
+    with timer.stage('encode'):
+        return encoding.encode(image, fmt), tier_data
+
+
+# Renders a profile card at each of the given sizes, e.g. the tiers from get_ladder_keys(), in a single call.
+# Every tier is drawn directly at its size, so it is the same card that a request for that size would get.
+def render_ladder(render_args, sizes, fmt='png'):
+    return [render_card(render_args[:-1] + (size,), fmt) for size in sizes]
+
+
+# Renders a full size card alongside the smaller tiers of its ladder in a single call, e.g. in a renderer process.
+# Returns the card's data and a list of the tiers' data.
+def render_card_ladder(render_args, sizes, fmt='png'):
+    return render_card(render_args, fmt), render_ladder(render_args, sizes, fmt)
+
+
+# Renders the cards of a ladder that are not cached yet, and caches them.
+# ladder_keys -> the (size, key) pairs from get_ladder_keys().
+def cache_ladder(ladder_keys, render_args, fmt='png'):
+    ladder_keys = [(size, key) for size, key in ladder_keys if cache.response_cache.get(key) is None]
+    if not ladder_keys:
+        return
+
+    sizes, keys = zip(*ladder_keys)
+    for key, data in zip(keys, render_ladder(render_args, sizes, fmt)):
+        cache.response_cache.set(key, key, encoding.mimetypes[fmt], data)
+
+
+# Prepares a renderer process by rendering the static sprites and decoding the most used images ahead of time.
+def init_renderer():
+    profiles.warm_sprites()
+    profiles.warm_images()
+    profiles.warm_colours()
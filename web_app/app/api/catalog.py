@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+from os import path
+
+
+# The placeholder names used when an ID cannot be found in the catalog.
+placeholders = {('characters', 'icon'): "UI_AvatarIcon_PlayerBoy",
+                ('namecards', 'icon'): "UI_NameCardIcon_0",
+                ('namecards', 'image'): "UI_NameCardPic_0_P"}
+
+
+# An in-memory index of Characters.json and Namecards.json that is loaded once and shared between requests.
+# Lookups are resolved with a single dictionary access keyed by the (ID, costume ID) tuple.
+# The JSONs are reloaded whenever their modification times change, e.g. after assets.generate_json() is run.
+class AssetCatalog:
+    def __init__(self, filepath="./app/api/assets/json", check_interval=1.0):
+        self.filepath = filepath
+        self.check_interval = check_interval
+        self.generation = 0
+
+        # Functions called after the catalog has been reloaded, e.g. to empty the caches of images of the old assets.
+        self.listeners = []
+
+        self._lock = threading.Lock()
+        self._next_check = 0
+        self._mtimes = None
+        self._tables = {}
+        self.reload()
+
+    # Gets the modification times of the JSON files the catalog is built from.
+    def _get_mtimes(self):
+        return tuple(path.getmtime(f"{self.filepath}/{name}.json") for name in ['Characters', 'Namecards'])
+
+    # Builds the lookup tables from the characters and namecards JSONs.
+    def _build_tables(self):
+        with open(f"{self.filepath}/Characters.json", "r") as file:
+            characters_json = json.load(file)
+        with open(f"{self.filepath}/Namecards.json", "r") as file:
+            namecards_json = json.load(file)
+
+        character_icons = {}
+        for avatar_id, character in characters_json.items():
+            character_icons[(avatar_id,)] = character['iconName']
+            for costume_id, costume in character['costumes'].items():
+                character_icons[(avatar_id, costume_id)] = costume['iconName']
+
+        namecard_icons = {}
+        namecard_images = {}
+        for namecard_id, namecard in namecards_json.items():
+            namecard_icons[(namecard_id,)] = namecard['iconName']
+            namecard_images[(namecard_id,)] = namecard['imageName']
+
+        return {('characters', 'icon'): character_icons,
+                ('namecards', 'icon'): namecard_icons,
+                ('namecards', 'image'): namecard_images}
+
+    # Reloads the catalog from disk. The new tables are swapped in at once, so lookups never see a partial catalog.
+    # If the JSONs cannot be read (e.g. they are mid-write), the previous catalog is kept.
+    def reload(self):
+        with self._lock:
+            try:
+                mtimes = self._get_mtimes()
+                tables = self._build_tables()
+            except (OSError, ValueError):
+                if self._mtimes is None:
+                    raise
+                return False
+
+            self._tables = tables
+            self._mtimes = mtimes
+            self.generation += 1
+
+        for listener in self.listeners:
+            listener()
+
+        return True
+
+    # Reloads the catalog if the JSONs have changed since they were last loaded.
+    # The files are only checked once every check_interval seconds.
+    def refresh(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+
+        try:
+            changed = self._get_mtimes() != self._mtimes
+        except OSError:
+            return False
+
+        return self.reload() if changed else False
+
+    # Gets the name of an icon or image from its file type and ID.
+    # f_id -> [0] is the avatar or namecard ID, [1] is an optional costume ID.
+    # Unknown costumes fall back to the avatar's default icon and unknown IDs fall back to a placeholder.
+    def get_name(self, f_type, f_id, i_type):
+        table = self._tables[(f_type, i_type)]
+
+        name = table.get(tuple(f_id))
+        if name is None and len(f_id) > 1:
+            name = table.get((f_id[0],))
+        if name is None:
+            name = placeholders[(f_type, i_type)]
+
+        return name
+
+    # Gets the names of icons or images for a list of IDs.
+    def get_names(self, f_type, f_ids, i_type):
+        self.refresh()
+        return [self.get_name(f_type, f_id, i_type) for f_id in f_ids]
+
+
+catalog = AssetCatalog()
@@ -0,0 +1,82 @@
+from io import BytesIO
+from PIL import Image
+
+
+# The MIME type and file extension of every output format.
+# 'png8' is a PNG quantised to a palette, which is much smaller but may band on gradients.
+mimetypes = {'png': 'image/png', 'png8': 'image/png', 'webp': 'image/webp', 'avif': 'image/avif'}
+extensions = {'png': 'png', 'png8': 'png', 'webp': 'webp', 'avif': 'avif'}
+
+# The encoder settings of every format, trading encoding time against size.
+# These can be overridden by operators through the ENCODING_POLICY setting.
+# png -> compress_level: 0 (fastest, largest) to 9 (slowest, smallest).
+# png8 -> colors: the size of the palette, compress_level: as above.
+# webp -> lossless: whether the card is encoded losslessly, quality: 0 to 100, method: 0 (fastest) to 6 (smallest).
+# avif -> quality: 0 to 100, speed: 0 (slowest, smallest) to 10 (fastest).
+policies = {'png': {'compress_level': 6},
+            'png8': {'colors': 256, 'compress_level': 6},
+            'webp': {'lossless': False, 'quality': 90, 'method': 4},
+            'avif': {'quality': 70, 'speed': 10}}
+
+# The formats that may be picked from a client's Accept header, in order of preference.
+# PNG is always used if none of them are accepted.
+negotiated_formats = ['webp']
+
+
+# Checks whether Pillow can encode the given format.
+def is_supported(fmt):
+    Image.init()
+    return fmt in mimetypes and {'png': 'PNG', 'png8': 'PNG', 'webp': 'WEBP', 'avif': 'AVIF'}[fmt] in Image.SAVE
+
+
+# Checks whether an Accept header allows a MIME type, ignoring any types with a quality of 0.
+def is_accepted(accept, mimetype):
+    for media_range in accept.split(','):
+        parameters = [parameter.strip() for parameter in media_range.split(';')]
+        if parameters[0].lower() != mimetype:
+            continue
+        if any(parameter.replace(' ', '') in ['q=0', 'q=0.0', 'q=0.00', 'q=0.000'] for parameter in parameters[1:]):
+            continue
+        return True
+
+    return False
+
+
+# Picks the output format from an explicit format parameter or, if there is none, the client's Accept header.
+# Returns None if the format parameter is not a supported format.
+def negotiate(fmt, accept):
+    if fmt:
+        fmt = fmt.lower()
+        return fmt if is_supported(fmt) else None
+
+    for fmt in negotiated_formats:
+        if is_supported(fmt) and is_accepted(accept, mimetypes[fmt]):
+            return fmt
+
+    return 'png'
+
+
+# Encodes a profile card in the given format, using that format's policy.
+def encode(image, fmt='png'):
+    policy = policies[fmt]
+    image_out = BytesIO()
+
+    if fmt == 'png':
+        image.save(image_out, 'PNG', compress_level=policy['compress_level'])
+    elif fmt == 'png8':
+        image = image.quantize(policy['colors'], method=Image.Quantize.FASTOCTREE)
+        image.save(image_out, 'PNG', compress_level=policy['compress_level'])
+    elif fmt == 'webp':
+        image.save(image_out, 'WEBP', lossless=policy['lossless'], quality=policy['quality'], method=policy['method'])
+    elif fmt == 'avif':
+        image.save(image_out, 'AVIF', quality=policy['quality'], speed=policy['speed'])
+
+    return image_out.getvalue()
+
+
+# Applies operator overrides to the encoding policies, e.g. {"webp": {"quality": 80}}.
+def configure(policy_overrides, formats):
+    for fmt, overrides in policy_overrides.items():
+        policies[fmt].update(overrides)
+
+    negotiated_formats[:] = [fmt for fmt in formats if fmt in mimetypes]
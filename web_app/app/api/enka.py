@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import deque
+import cloudscraper
+from cloudscraper.exceptions import CloudflareException
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+
+# A client for the Enka Network API that reuses one pooled, keep-alive session per worker.
+# - Every call has connect and read timeouts, so a slow upstream cannot block a worker indefinitely.
+# - Connection errors, timeouts and server errors are retried with a bounded exponential backoff.
+# - A player the API has no data for is returned as an empty dictionary, while a call that failed returns None, so
+#   callers can keep any data they already have instead of treating the player as missing.
+class EnkaClient:
+    def __init__(self, url="https://enka.shinshin.moe/u/{userid}/__data.json", connect_timeout=3.0,
+                 read_timeout=10.0, retries=2, backoff=0.5, max_backoff=4.0, pool_size=10):
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+
+        self.calls = 0
+        self.errors = 0
+        self.retried = 0
+        self.total_latency = 0
+        self.latencies = deque(maxlen=1024)
+
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    # Gets the worker's session, creating it if it does not exist yet.
+    # A new session is created after a fork, as connections cannot be shared between processes.
+    def get_session(self):
+        with self._lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = cloudscraper.create_scraper(browser={'browser': 'firefox', 'platform': 'windows',
+                                                               'mobile': False})
+
+                # The scraper's cipher suite adapter is replaced with an identical one that has a larger pool.
+                session.mount('https://', cloudscraper.CipherSuiteAdapter(cipherSuite=session.cipherSuite,
+                                                                          ecdhCurve=session.ecdhCurve,
+                                                                          pool_connections=self.pool_size,
+                                                                          pool_maxsize=self.pool_size))
+                session.mount('http://', HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size))
+
+                self._session = session
+                self._session_pid = os.getpid()
+
+            return self._session
+
+    # Gets the time to wait before the given retry attempt.
+    def get_backoff(self, attempt):
+        return min(self.backoff * (2 ** attempt), self.max_backoff)
+
+    # Gets a user's data from the Enka Network API, an empty dictionary if the API has no data for the user, or None if
+    # it could not be fetched.
+    def get_player(self, userid):
+        session = self.get_session()
+        url = self.url.format(userid=userid)
+
+        for attempt in range(0, self.retries + 1):
+            if attempt > 0:
+                self.retried += 1
+                time.sleep(self.get_backoff(attempt - 1))
+
+            start = time.perf_counter()
+            try:
+                response = session.get(url, timeout=(self.connect_timeout, self.read_timeout))
+            except (RequestException, CloudflareException):
+                response = None
+            self.record_latency(time.perf_counter() - start)
+
+            # Server errors and rate limits are retried, while any other response is final.
+            if response is None or response.status_code >= 500 or response.status_code == 429:
+                continue
+
+            try:
+                user_data = response.json()
+            except ValueError:
+                # Unknown or invalid UserIDs are answered with a client error rather than JSON.
+                if response.status_code in [400, 404]:
+                    return {}
+                break
+
+            return user_data if isinstance(user_data, dict) else {}
+
+        self.errors += 1
+        return None
+
+    # Records the latency of a single call to the API.
+    def record_latency(self, latency):
+        with self._lock:
+            self.calls += 1
+            self.total_latency += latency
+            self.latencies.append(latency)
+
+    # Gets the client's counters and the latency percentiles of its most recent calls.
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            stats = {'calls': self.calls, 'errors': self.errors, 'retries': self.retried,
+                     'mean_latency': self.total_latency / self.calls if self.calls else 0}
+
+        for percentile in [50, 95, 99]:
+            index = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+            stats[f'p{percentile}_latency'] = latencies[index] if latencies else 0
+
+        return stats
+
+
+enka_client = EnkaClient()
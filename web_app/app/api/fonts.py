@@ -0,0 +1,41 @@
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+
+# The font used for all text on a profile card.
+default_font = './app/api/assets/zh-cn.ttf'
+
+# The labels drawn on profile cards that never change, as (text, size) pairs.
+# These are rasterised once, so only the user's own text has to be rasterised for each card.
+labels = [('Adventure Rank', 15), ('Spiral Abyss', 15), ('Achievements', 15), ('Characters', 15), ('Namecards', 15)]
+
+
+# Gets a font at the given size, which is only loaded from its file the first time it is needed.
+@lru_cache(maxsize=32)
+def get_font(font, size):
+    return ImageFont.truetype(font, size=size)
+
+
+# Gets a piece of text rasterised into a greyscale mask, alongside the offset from the text's location to the mask.
+# The mask is the same coverage that ImageDraw.text() would draw, so pasting a colour through it gives the same pixels.
+@lru_cache(maxsize=64)
+def text_mask(text, size, font=default_font):
+    font_face = get_font(font, size)
+    left, top, right, bottom = font_face.getbbox(text)
+
+    mask = Image.new('L', (right - left, bottom - top))
+    ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font_face)
+
+    return mask, (left, top)
+
+
+# Loads the default font and rasterises every static label ahead of time.
+def warm():
+    for text, size in labels:
+        text_mask(text, size)
+
+
+# Empties the font caches, e.g. after the assets have been updated.
+def clear():
+    for cache in [get_font, text_mask]:
+        cache.cache_clear()
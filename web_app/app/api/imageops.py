@@ -0,0 +1,41 @@
+from functools import lru_cache
+
+
+# Pixel operations backed by 256-entry lookup tables, which Pillow applies to every pixel in C.
+# Each table is built once per set of parameters and reused, rather than calling a Python function for every entry.
+
+# Gets a table that multiplies each band by its own factor, with the results rounded and clipped as Pillow does.
+@lru_cache(maxsize=32)
+def get_multiply_table(factors):
+    table = []
+    for factor in factors:
+        table += [min(255, max(0, round(value * factor))) for value in range(0, 256)]
+
+    return table
+
+
+# Gets a table that sets every value above the threshold to the given value, and every other value to 0.
+@lru_cache(maxsize=32)
+def get_flatten_table(value, threshold):
+    return [value if level > threshold else 0 for level in range(0, 256)]
+
+
+# Multiplies each band of an image by its own factor, e.g. (1, 1, 1, 0.5) to halve the opacity of an RGBA image.
+def multiply(image, factors):
+    return image.point(get_multiply_table(tuple(factors)))
+
+
+# Multiplies every band of an image, including any alpha band, by the same factor.
+def scale(image, factor):
+    return multiply(image, (factor,) * len(image.getbands()))
+
+
+# Sets every value of a single band image above the threshold to the given value, and every other value to 0.
+def flatten(channel, value, threshold=0):
+    return channel.point(get_flatten_table(value, threshold))
+
+
+# Gives every pixel of an RGBA image whose alpha is above the threshold the same alpha, and hides the rest.
+# The image is changed in place.
+def flatten_alpha(image, alpha, threshold=0):
+    image.putalpha(flatten(image.getchannel('A'), alpha, threshold))
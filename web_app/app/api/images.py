@@ -0,0 +1,128 @@
+import threading
+from collections import OrderedDict
+from PIL import Image
+from app.api.atlas import load_image_store
+
+
+# Gets the number of bytes an image takes up once decoded.
+def get_image_bytes(image):
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+
+# A byte-budgeted LRU cache of decoded images, keyed by asset name and mode.
+# Images are decoded and converted once, and callers are always given a copy so the cached image is never mutated.
+class ImageCache:
+    def __init__(self, max_bytes, filepath="./app/api/assets"):
+        self.max_bytes = max_bytes
+        self.filepath = filepath
+        self.current_bytes = 0
+
+        # An atlas of every decoded RGBA image in the images folder shared by all workers, see open_store().
+        self.store = None
+        self.store_path = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Gets a copy of a decoded image, loading it from disk if it is not already cached.
+    # name -> the path of the image relative to the assets folder, without its extension.
+    def get(self, name, mode='RGBA'):
+        return self.get_built((name, mode), lambda: self._load(name, mode))
+
+    # Gets a copy of a cached image, building it with the given function if it is not already cached.
+    # This lets images derived from the assets, e.g. the base layers of profile cards, share the same budget logic.
+    def get_built(self, key, build):
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image.copy()
+            self.misses += 1
+
+        # Builds the image outside the lock so other lookups are not blocked by disk reads or drawing.
+        image = build()
+
+        self.put(key, image)
+        return image.copy()
+
+    # Decodes an image from the assets folder.
+    def _load(self, name, mode):
+        with Image.open(f"{self.filepath}/{name}.png") as file:
+            return file.convert(mode)
+
+    # Adds a decoded image to the cache, evicting the least recently used images until it fits in the budget.
+    def put(self, key, image):
+        image_bytes = get_image_bytes(image)
+        if image_bytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._images:
+                return
+
+            self._images[key] = image
+            self.current_bytes += image_bytes
+            self._evict()
+
+    # Removes the least recently used images until the cache is under its budget.
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._images:
+            empty_var, image = self._images.popitem(last=False)
+            self.current_bytes -= get_image_bytes(image)
+            self.evictions += 1
+
+    # Changes the byte budget of the cache, evicting images if it has shrunk.
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    # Maps the atlas of every decoded image built by the assets script, if it has been built.
+    def open_store(self, filepath):
+        self.store_path = filepath
+        self.store = load_image_store(filepath)
+
+    # Empties the cache, e.g. after the assets have been updated, and maps the image store again in case it was rebuilt.
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.current_bytes = 0
+
+        if self.store_path is not None:
+            self.store = load_image_store(self.store_path)
+
+    # Gets the cache's counters.
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'images': len(self._images),
+                    'bytes': self.current_bytes,
+                    'max_bytes': self.max_bytes,
+                    'store_images': 0 if self.store is None else len(self.store)}
+
+
+image_cache = ImageCache(128 * 1024 * 1024)
+
+
+# Opens an image from the assets folder through the shared image cache.
+def open_image(name, mode='RGBA'):
+    return image_cache.get(name, mode)
+
+
+# Opens an icon or namecard picture from the assets images folder.
+# RGBA images are read-only views of the shared image store if there is one, which Pillow copies if they are modified.
+# Otherwise, they are decoded through the shared image cache.
+def open_icon(name, mode='RGBA'):
+    if image_cache.store is not None and mode == 'RGBA':
+        image = image_cache.store.get(name)
+        if image is not None:
+            return image
+
+    return image_cache.get(f"images/{name}", mode)
@@ -0,0 +1,168 @@
+import threading
+from bisect import bisect_left
+from flask import Response
+from app.api import bp
+from app.api.admission import admission
+from app.api.cache import response_cache
+from app.api.enka import enka_client
+from app.api.images import image_cache
+from app.api.players import player_cache
+from app.api.warmer import warmer
+from app.api.timing import StageTimer, null_timer
+
+
+# The upper bounds, in seconds, of the buckets that durations are counted in.
+default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# The type and description of every metric that is recorded.
+descriptions = {'genshin_requests_total': ('counter', "Profile card requests by how they were served."),
+                'genshin_request_seconds': ('histogram', "Time taken to serve a profile card request."),
+                'genshin_stage_seconds': ('histogram', "Time spent in each stage of serving a profile card."),
+                'genshin_error_images_total': ('counter', "Error images sent instead of a profile card.")}
+
+
+# A histogram of durations, counted into buckets that are made cumulative when they are exported.
+class Histogram:
+    def __init__(self, buckets=default_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# Formats a set of labels, e.g. {stage="fetch",le="0.1"}.
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+# Counters and histograms of how profile card requests are served, exported in the Prometheus text format.
+# Every worker keeps its own metrics, so they should be scraped and added up per worker.
+# When disabled, requests are timed with the null timer and nothing is recorded.
+class Metrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    # Gets a timer for a request's stages, which records nothing if metrics are disabled.
+    def get_timer(self):
+        return StageTimer() if self.enabled else null_timer
+
+    # Adds to a counter, e.g. inc('genshin_error_images_total', showcase='characters').
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    # Counts a duration, in seconds, in a histogram.
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    # Records a served request from its timer, whose 'total' stage is the time taken by the whole request.
+    # outcome -> 'rendered', 'coalesced', 'cached', 'not_modified', 'error', 'limited' or 'overloaded'.
+    def record_request(self, outcome, timer):
+        if not self.enabled:
+            return
+
+        self.inc('genshin_requests_total', outcome=outcome)
+        for stage, duration in timer.stages.items():
+            if stage == 'total':
+                self.observe('genshin_request_seconds', duration, outcome=outcome)
+            else:
+                self.observe('genshin_stage_seconds', duration, stage=stage)
+
+    # Gets the counters of the caches, renders, warmer and Enka Network client as (name, type, description, samples).
+    def collect_stats(self):
+        images = image_cache.stats()
+        responses = response_cache.stats()
+        players = player_cache.stats()
+        enka = enka_client.stats()
+        renders = admission.stats()
+        warmed = warmer.stats()
+
+        return [('genshin_cache_hits_total', 'counter', "Cache lookups that were found.",
+                 [((('cache', 'image'),), images['hits']), ((('cache', 'response'),), responses['hits']),
+                  ((('cache', 'player'),), players['hits'] + players['stale_hits'])]),
+                ('genshin_cache_misses_total', 'counter', "Cache lookups that were not found.",
+                 [((('cache', 'image'),), images['misses']), ((('cache', 'response'),), responses['misses']),
+                  ((('cache', 'player'),), players['misses'])]),
+                ('genshin_image_cache_bytes', 'gauge', "Bytes of decoded images held by the image cache.",
+                 [((), images['bytes'])]),
+                ('genshin_renders_in_flight', 'gauge', "Cards being rendered for /genshin requests.",
+                 [((), renders['in_flight'])]),
+                ('genshin_warmed_cards_total', 'counter', "Popular cards re-rendered by the warmer.",
+                 [((), warmed['warmed'])]),
+                ('genshin_enka_calls_total', 'counter', "Calls made to the Enka Network API.",
+                 [((), enka['calls'])]),
+                ('genshin_enka_errors_total', 'counter', "Calls to the Enka Network API that failed.",
+                 [((), enka['errors'])]),
+                ('genshin_enka_retries_total', 'counter', "Calls to the Enka Network API that were retried.",
+                 [((), enka['retries'])]),
+                ('genshin_enka_latency_seconds', 'summary', "Latency of recent calls to the Enka Network API.",
+                 [((('quantile', '0.5'),), enka['p50_latency']), ((('quantile', '0.95'),), enka['p95_latency']),
+                  ((('quantile', '0.99'),), enka['p99_latency'])])]
+
+    # Exports every metric in the Prometheus text format.
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(histogram.counts), histogram.sum, histogram.count)
+                          for key, histogram in self._histograms.items()}
+
+        lines = []
+        for name, (metric_type, description) in descriptions.items():
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+
+            for (histogram_name, labels), (counts, total, count) in sorted(histograms.items()):
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(list(default_buckets) + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {total}")
+                lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+        for name, metric_type, description, samples in self.collect_stats():
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+            lines += [f"{name}{format_labels(labels)} {value}" for labels, value in samples]
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# Gets a Server-Timing header value from a request's timer, e.g. 'fetch;dur=12.30, encode;dur=98.10'.
+def get_server_timing(timer):
+    return ", ".join(f"{stage};dur={duration * 1000:.2f}" for stage, duration in timer.stages.items())
+
+
+# Exports the metrics of this worker in the Prometheus text format.
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,125 @@
+import copy
+import threading
+import time
+from app.api.enka import enka_client
+
+
+# A cache of player data from the Enka Network API, shared between requests.
+# - Player data is kept for as long as the API's 'ttl' hint allows, or default_ttl if there is none.
+# - Concurrent requests for the same UserID wait on a single fetch instead of each calling the API.
+# - Data that has expired less than stale_ttl seconds ago is served while it is refreshed in the background.
+# - If the API cannot be reached, any cached data is kept and the user is not fetched again for retry_interval seconds.
+# clock -> the time source, which can be replaced to step through time in tests.
+class PlayerCache:
+    def __init__(self, default_ttl=60, stale_ttl=600, missing_ttl=30, retry_interval=10, client=enka_client,
+                 clock=time.monotonic):
+        self.client = client
+        self.clock = clock
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.missing_ttl = missing_ttl
+        self.retry_interval = retry_interval
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+        # _entries -> {userid: (expiry, playerInfo or None)}
+        # _fetches -> {userid: threading.Event} for every fetch currently in flight.
+        # _retries -> {userid: the time after which a failed fetch may be retried}
+        self._entries = {}
+        self._fetches = {}
+        self._retries = {}
+        self._lock = threading.Lock()
+
+    # Fetches a user's data and stores it, waking any requests that were waiting for it.
+    # Only a user the API answered for without any data is remembered as missing. If the API could not be reached, the
+    # cached data, even if it is stale, is kept until the fetch is retried.
+    def _refresh(self, userid, event):
+        try:
+            user_data = self.client.get_player(userid)
+            if user_data is None:
+                with self._lock:
+                    self._retries[userid] = self.clock() + self.retry_interval
+                return
+
+            if 'playerInfo' in user_data:
+                ttl = user_data.get('ttl', self.default_ttl)
+                entry = (self.clock() + ttl, user_data['playerInfo'])
+            else:
+                entry = (self.clock() + self.missing_ttl, None)
+
+            with self._lock:
+                self._entries[userid] = entry
+                self._retries.pop(userid, None)
+        finally:
+            with self._lock:
+                del self._fetches[userid]
+            event.set()
+
+    # Starts fetching a user's data if it is not already being fetched.
+    # Returns the fetch's event and whether the caller is responsible for running the fetch.
+    def _start_fetch(self, userid):
+        event = self._fetches.get(userid)
+        if event is not None:
+            return event, False
+
+        event = threading.Event()
+        self._fetches[userid] = event
+        return event, True
+
+    # Gets a copy of a user's playerInfo, or None if the user does not exist.
+    def get(self, userid):
+        with self._lock:
+            entry = self._entries.get(userid)
+            now = self.clock()
+
+            # Fresh data is returned straight away.
+            if entry is not None and now < entry[0]:
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+
+            # Stale data is returned straight away, and refreshed in the background.
+            retrying = now < self._retries.get(userid, 0)
+            if entry is not None and now < entry[0] + self.stale_ttl:
+                self.stale_hits += 1
+                if not retrying:
+                    event, leader = self._start_fetch(userid)
+                    if leader:
+                        threading.Thread(target=self._refresh, args=(userid, event), daemon=True).start()
+                return copy.deepcopy(entry[1])
+
+            self.misses += 1
+            if retrying:
+                return None
+            event, leader = self._start_fetch(userid)
+
+        # Old data is occasionally pruned so that the cache does not grow forever.
+        if self.misses % 1024 == 0:
+            self.prune()
+
+        # Only one request fetches the data, while the others wait for it.
+        if leader:
+            self._refresh(userid, event)
+        else:
+            event.wait()
+
+        with self._lock:
+            entry = self._entries.get(userid)
+        return None if entry is None else copy.deepcopy(entry[1])
+
+    # Removes any expired data that is too old to be served stale.
+    def prune(self):
+        now = self.clock()
+        with self._lock:
+            for userid in [userid for userid, entry in self._entries.items() if now >= entry[0] + self.stale_ttl]:
+                del self._entries[userid]
+            self._retries = {userid: retry for userid, retry in self._retries.items() if now < retry}
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'stale_hits': self.stale_hits, 'misses': self.misses,
+                    'players': len(self._entries), 'fetches': len(self._fetches)}
+
+
+player_cache = PlayerCache()
@@ -1,108 +1,106 @@
 import re
-from math import sqrt
-from PIL import Image, ImageDraw, ImageFont, ImageChops
-import cv2
+from functools import lru_cache
+from os import listdir
+from PIL import Image, ImageDraw, ImageChops
 import numpy as np
+from app.api.atlas import atlases
+from app.api.images import ImageCache, image_cache, open_icon
+from app.api import fonts, imageops, sprites
+from app.api.timing import null_timer
+
+
+# Groups pixels into the given number of clusters using k-means.
+# The initial centres are picked with k-means++ from a fixed seed, so the same pixels always give the same clusters.
+# Returns the centre of each cluster and the number of pixels in it.
+def get_clusters(pixels, clusters, iterations=50):
+    random = np.random.default_rng(0)
+    centres = pixels[[random.integers(len(pixels))]]
+    for empty_var in range(1, clusters):
+        distances = ((pixels[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+        if distances.sum() == 0:
+            break
+        centres = np.vstack([centres, pixels[random.choice(len(pixels), p=distances / distances.sum())]])
+
+    for empty_var in range(0, iterations):
+        labels = ((pixels[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        counts = np.bincount(labels, minlength=len(centres))
+
+        # Each centre is moved to the average of its pixels. Empty clusters keep their previous centre.
+        sums = np.stack([np.bincount(labels, weights=pixels[:, channel], minlength=len(centres))
+                         for channel in range(0, 3)], axis=1)
+        new_centres = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centres)
+
+        converged = np.allclose(new_centres, centres, atol=0.1)
+        centres = new_centres
+        if converged:
+            break
+
+    return centres, counts
 
 
 # Gets the most dominant colour in an image, but slightly darkened for improved contrast.
 def get_colour(image):
     image = image.resize((image.size[0]//8, image.size[1]//8), resample=Image.Resampling.LANCZOS)
-    image = np.array(image)[:, :, :-1]
-    pixels = np.float32(image.reshape(-1, 3))
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 200, .1)
+    pixels = np.asarray(image, dtype=np.float64)[:, :, :3].reshape(-1, 3)
+    palette, counts = get_clusters(pixels, 5)
 
-    empty_var, labels, palette = cv2.kmeans(pixels, 5, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
-    empty_var, counts = np.unique(labels, return_counts=True)
-
-    counts[np.argmax(counts)] = 0
-    dominant = palette[np.argmax(counts)]
+    # The most dominant cluster is the icon's background, so it is skipped.
+    order = np.argsort(-counts, kind='stable')[1:]
+    if len(order) == 0:
+        order = [0]
+    dominant = palette[order[0]]
 
     # If any colours are very close to black or white, the next dominant colour is picked.
-    while all(rgb_value >= 240 for rgb_value in dominant) or all(rgb_value <= 20 for rgb_value in dominant):
-        counts[np.argmax(counts)] = 0
-        dominant = palette[np.argmax(counts)]
+    for index in order:
+        if not (np.all(palette[index] >= 240) or np.all(palette[index] <= 20)):
+            dominant = palette[index]
+            break
 
     # If the dominant colour is bright, it is lowered by 20 RGB points.
     # If it is dark, it is brightened by 20 RGB points.
-    dominant -= 20
+    dominant = dominant - 20
     if np.average(dominant) <= 127.5:
         dominant += 30
 
-    return tuple(dominant)
-
-
-# Generates a line, with its colour set as a gradient, that has rounded edges.
-# Rounded edges work for most small widths.
-# Breaks on any widths above 8 or on any diagonal lines.
-def add_gradient_line(image, start_colour, end_colour, loc, width):
-    draw = ImageDraw.Draw(image)
-
-    # Finds if any horizontal or vertical changes occur.
-    horizontal = 0 if loc[2] - loc[0] == 0 else 1
-    vertical = 0 if loc[3] - loc[1] == 0 else 1
-
-    # Calculates the values to shift the circles by.
-    h_shift = width/2
-    v_shift = 1 if width - 5 < 0 else 0
-    v_shift = -1 if width - 6 > 0 else v_shift
-
-    # Draws two ellipses for rounded edges.
-    draw.ellipse((loc[0] - 2 + (v_shift * vertical), loc[1] - h_shift + 1, loc[0] + h_shift, loc[1] + h_shift),
-                 fill=tuple(start_colour))
-    draw.ellipse((loc[2] - 2 + (v_shift * vertical), loc[3] - h_shift + 1, loc[2] + h_shift, loc[3] + h_shift),
-                 fill=tuple(end_colour))
+    return tuple(int(rgb_value) for rgb_value in np.clip(dominant, 0, 255))
 
-    # Finds the RGB values to step by for each pixel.
-    line_length = int(sqrt((loc[2] - loc[0])**2 + (loc[3] - loc[1])**2))
-    step_colour = [(start_rgb - end_colour[index])/line_length for index, start_rgb in enumerate(start_colour)]
 
-    # Iterates through every pixel to draw it in.
-    current_colour = start_colour
-    for pixel in range(0, line_length):
-        current_colour = [current_colour[index] - step_colour[index] for index in range(0, 3)]
+# Gets the dominant colour of an icon from its name.
+# There are only a few hundred icons, so each icon's colour is only calculated once.
+@lru_cache(maxsize=1024)
+def get_icon_colour(name):
+    return get_colour(open_icon(name))
 
-        pixel_h = pixel * horizontal
-        pixel_v = pixel * vertical
 
-        draw.line((loc[0] + pixel_h, loc[1] + pixel_v,  loc[0] + horizontal + pixel_h, loc[1] + vertical + pixel_v),
-                  fill=tuple(map(int, current_colour)),
-                  width=width)
+# Adds a line, with its colour set as a gradient, that has rounded edges.
+# The line is rendered once into a sprite and then pasted onto the image.
+def add_gradient_line(image, start_colour, end_colour, loc, width):
+    line, line_loc = sprites.gradient_line(tuple(start_colour), tuple(end_colour), tuple(loc), width)
+    image.paste(line, line_loc, line)
 
 
-# Draws a circle with the specified parameters.
-def draw_circle(mode, fill, outline, width, size, alpha=255):
-    # The size is initially set to 3x the requested size so that smoother curves can be created.
-    large_size = (size[0] * 3, size[1] * 3)
-    circle = Image.new(mode, large_size)
+# Scales a length in the full size layout, e.g. a font or icon size, to a card of the given scale.
+# Lengths never go below a pixel, so that tiny cards can still be drawn.
+def scale_length(length, scale):
+    return max(1, round(length * scale))
 
-    draw = ImageDraw.Draw(circle)
-    draw.ellipse((0, 0) + large_size, fill=fill, outline=outline, width=width)
-    circle = circle.resize(size, resample=Image.Resampling.LANCZOS)
 
-    # If the opacity needs to be changed, it is changed if the mode is compatible.
-    if mode != 'L' and alpha < 255:
-        new_alpha = circle.getchannel('A')
-        new_alpha = new_alpha.point(lambda a_value: alpha if a_value > 0 else 0)
+# Scales a width and height in the full size layout to a card of the given scale.
+def scale_size(size, scale):
+    return tuple(scale_length(length, scale) for length in size)
 
-        circle.putalpha(new_alpha)
 
-    return circle
+# Scales a location or box in the full size layout to a card of the given scale.
+def scale_loc(loc, scale):
+    return tuple(round(value * scale) for value in loc)
 
 
 # Draws a designated object a given amount of times, with an input horizontal and vertical offset.
+# The object should be a sprite that has already been resized and had its opacity set.
+# The location and offsets are in the full size layout, and are scaled to the card's scale.
 # offset -> [0] is h_offset, [1] is v_offset
 # object_num -> [0] is maximum object, [1] is maximum object per row
-def draw_multi(image, icon, alpha, loc, size, object_num, offset):
-    # Reduces the opacity of the input icon, if required.
-    if alpha < 255:
-        new_alpha = icon.getchannel('A')
-        new_alpha = new_alpha.point(lambda a_value: 64 if a_value > 1 else 0)
-        icon.putalpha(new_alpha)
-
-    # Resizes the input shadow image to the requested size.
-    icon = icon.resize(size, resample=Image.Resampling.LANCZOS)
-
+def draw_multi(image, icon, loc, object_num, offset, scale=1):
     # Initialises the offset values.
     h_offset = -offset[0]
     v_offset = 0
@@ -114,7 +112,7 @@ def draw_multi(image, icon, alpha, loc, size, object_num, offset):
             v_offset += offset[1]
 
         # Calculates the new location based on the offsets given.
-        new_loc = (loc[0] + h_offset, loc[1] + v_offset)
+        new_loc = scale_loc((loc[0] + h_offset, loc[1] + v_offset), scale)
 
         # Pastes the object to the required location.
         image.paste(icon, new_loc, icon)
@@ -122,95 +120,79 @@ def draw_multi(image, icon, alpha, loc, size, object_num, offset):
 
 # Draws a designated circle a given amount of times, with a given horizontal and vertical offset.
 # A number of circles per row must also be specified.
+# The location, size and offsets are in the full size layout, and are scaled to the card's scale.
 # offset -> [0] is h_offset, [1] is v_offset
 # circle_num -> [0] is maximum circles, [1] is maximum circles per row
-def draw_multi_c(image, icon, bg_colour, border_colour, alpha, width, loc, size, circle_num, offset, d_shadow=False):
-    # Draws a circle with the requested parameters.
-    circle = draw_circle('RGBA', bg_colour, border_colour, width, icon.size, alpha)
+def draw_multi_c(image, bg_colour, border_colour, alpha, width, loc, size, circle_num, offset, d_shadow=False,
+                 scale=1):
+    # Gets a circle with the requested parameters.
+    circle = sprites.circle(bg_colour, border_colour, width, scale_size(size, scale), alpha)
 
-    # Creates a drop-shadow if one is needed.
+    # Draws the drop-shadows beneath every circle first, if they are needed.
     if d_shadow:
-        shadow = draw_circle('RGBA', '#000000', 0, 20, icon.size, 64)
-        shadow = shadow.resize((size[0] + 6, size[1]), resample=Image.Resampling.LANCZOS)
+        shadow = sprites.circle('#000000', 0, 20, scale_size((size[0] + 6, size[1]), scale), 64)
+        draw_multi(image, shadow, (loc[0] - 3, loc[1] + 5), circle_num, offset, scale)
 
-    # Resizes the circle to the input size.
-    circle = circle.resize(size, resample=Image.Resampling.LANCZOS)
+    draw_multi(image, circle, loc, circle_num, offset, scale)
 
-    # Initialises the offset values.
-    h_offset = -offset[0]
-    v_offset = 0
-    for item in range(0, circle_num[0]):
-        # Calculates the offset based on the current circle number.
-        h_offset += offset[0]
-        if item != 0 and item % circle_num[1] == 0:
-            h_offset = 0
-            v_offset += offset[1]
 
-        # Calculates the new location based on the offsets given.
-        new_loc = (loc[0] + h_offset, loc[1] + v_offset)
+# Resizes an icon to the given size.
+def resize_icon(name, size):
+    return open_icon(name).resize(size, resample=Image.Resampling.LANCZOS)
 
-        # Pastes the circle and a shadow, if required, to the required location.
-        if d_shadow:
-            image.paste(shadow, (new_loc[0] - 3, new_loc[1] + 5), shadow)
-        image.paste(circle, new_loc, circle)
 
+# Resizes an icon to the given size and cuts it into a circle.
+def resize_round_icon(name, size):
+    icon = resize_icon(name, size)
 
-# Adds an icon to the image. If a drop-shadow is required, it is added.
-def add_icon(image, icon, loc, size, d_shadow=None):
-    # Adds a drop-shadow if it is requested.
-    if d_shadow is not None:
-        # Reduces the opacity of the shadow image.
-        new_alpha = d_shadow.getchannel('A')
-        new_alpha = new_alpha.point(lambda a_value: 64 if a_value > 1 else 0)
-        d_shadow.putalpha(new_alpha)
+    # Converts the icon to a rounded image.
+    mask = ImageChops.darker(sprites.circle_mask(size), icon.split()[-1])
+    icon.putalpha(mask)
 
-        # Resizes the input shadow image to the requested size.
-        d_shadow = d_shadow.resize(size, resample=Image.Resampling.LANCZOS)
-        image.paste(d_shadow, (loc[0], loc[1] + 5), d_shadow)
+    return icon
 
-    icon = icon.resize(size, resample=Image.Resampling.LANCZOS)
-    image.paste(icon, loc, icon)
 
+# Gets an icon resized to the given size.
+# It is taken from the pre-resized icon atlas if it is there. Otherwise, e.g. for the sizes of smaller cards, it is
+# resized from its image once and kept in the image cache.
+def get_icon(name, size):
+    icon = atlases.get_icon('icons', name, size)
+    if icon is None:
+        icon = image_cache.get_built(('icons', name, size), lambda: resize_icon(name, size))
 
-# Places a circular icon without any background, border or shadows.
-# This is typically used in conjunction with draw_multi_c() to improve efficiency.
-def add_icon_c(image, icon, loc, size):
-    # Resizes the icon to a smaller size.
-    icon = icon.resize(size, resample=Image.Resampling.LANCZOS)
+    return icon
 
-    # Converts the icon to a rounded image.
-    mask = draw_circle('L', 255, 255, 0, icon.size)
-    mask = ImageChops.darker(mask, icon.split()[-1])
-    icon.putalpha(mask)
+
+# Gets an icon resized to the given size and cut into a circle, in the same way as get_icon().
+def get_round_icon(name, size):
+    icon = atlases.get_icon('round', name, size)
+    if icon is None:
+        icon = image_cache.get_built(('round', name, size), lambda: resize_round_icon(name, size))
+
+    return icon
+
+
+# Places a circular icon, by its name, without any background, border or shadows.
+# This is typically used in conjunction with draw_multi_c() to improve efficiency.
+def add_icon_c(image, name, loc, size):
+    icon = get_round_icon(name, size)
 
     # Places the icon on the background image.
     image.paste(icon, loc, icon)
 
 
-# Adds a circular icon to the image. Adds a drop-shadow if needed.
+# Adds a circular icon, by its name, to the image. Adds a drop-shadow if needed.
 # This is a function for icons with borders.
-def add_icon_cf(image, icon, bg_colour, border_colour, alpha, width, loc, size, d_shadow=False):
-    # Generates a background and border.
-    icon_bg = draw_circle('RGBA', bg_colour, 0, 0, icon.size, alpha)
-    border = draw_circle('RGBA', 0, border_colour, width, icon.size)
-
-    # Creates a drop-shadow if one is needed.
-    if d_shadow:
-        shadow = draw_circle('RGBA', '#000000', 0, width, icon.size, 64)
+def add_icon_cf(image, name, bg_colour, border_colour, alpha, width, loc, size, d_shadow=False):
+    # Gets a background and border.
+    icon_bg = sprites.circle(bg_colour, 0, 0, size, alpha)
+    border = sprites.circle(0, border_colour, width, size, 255)
 
-    # Resizes the icon (and everything else) to the input size.
-    icon_bg = icon_bg.resize(size, resample=Image.Resampling.LANCZOS)
-    icon = icon.resize(size, resample=Image.Resampling.LANCZOS)
-    border = border.resize(size, resample=Image.Resampling.LANCZOS)
-
-    # Converts the icon to a rounded image.
-    mask = draw_circle('L', 255, 255, 0, icon.size)
-    mask = ImageChops.darker(mask, icon.split()[-1])
-    icon.putalpha(mask)
+    icon = get_round_icon(name, size)
 
     # Places a drop-shadow if one is requested.
     if d_shadow:
-        shadow = shadow.resize((size[0] + 6, size[1]), resample=Image.Resampling.LANCZOS)
+        shadow = sprites.circle('#000000', 0, width, (size[0] + 6, size[1]), 64)
         image.paste(shadow, (loc[0] - 3, loc[1] + 5), shadow)
 
     # Places the icon on the background image.
@@ -220,18 +202,33 @@ def add_icon_cf(image, icon, bg_colour, border_colour, alpha, width, loc, size,
 
 
 # Draws any input text at the given parameters.
-def add_text(image, colour, text, loc, size, font='./app/api/assets/zh-cn.ttf'):
+def add_text(image, colour, text, loc, size, font=fonts.default_font):
     draw = ImageDraw.Draw(image)
 
     # Draws the text.
-    font = ImageFont.truetype(font, size=size)
+    font = fonts.get_font(font, size)
     draw.text(loc, text, fill=colour, font=font)
 
 
-# Draws the user statistics.
-def draw_statistics(image, user_info):
+# Draws a static label at the given parameters from its pre-rasterised mask, giving the same result as add_text().
+def add_label(image, colour, text, loc, size, font=fonts.default_font):
+    mask, offset = fonts.text_mask(text, size, font)
+    image.paste(colour, (loc[0] + offset[0], loc[1] + offset[1]), mask)
+
+
+# The names of the user statistics, in the order they are drawn.
+info_names = {'rank': 'Adventure Rank', 'abyss': 'Spiral Abyss', 'achievements': 'Achievements'}
+
+
+# Draws the names of the user statistics, which are the same on every card.
+def draw_statistic_names(image, scale=1):
+    for count, name in enumerate(info_names.values()):
+        add_label(image, '#F0D6A9', name, scale_loc((35, 230 + count * 50), scale), scale_length(15, scale))
+
+
+# Draws the values of the user statistics.
+def draw_statistics(image, user_info, scale=1):
     offset = -50
-    info_names = {'rank': 'Adventure Rank', 'abyss': 'Spiral Abyss', 'achievements': 'Achievements'}
 
     # Finds the maximum length of the values.
     max_len = 4
@@ -244,17 +241,27 @@ def draw_statistics(image, user_info):
     for key in info_names:
         offset += 50
         value = user_info[key]
-        name = info_names[key]
-
-        add_text(image, '#F0D6A9', name, (35, 230 + offset), 15)
 
         # Offsets the value with spaces to right-align them all.
         value = ("  " * (max_len - len(value))) + value
-        add_text(image, '#F0D6A9', value, (170, 230 + offset), 15)
+        add_text(image, '#F0D6A9', value, scale_loc((170, 230 + offset), scale), scale_length(15, scale))
+
+
+# Draws the parts of the characters or namecards showcase that are the same on every card.
+def draw_showcase_base(image, s_type, scale=1):
+    if s_type == 'namecards':
+        # Draws a shadow on all the namecard locations beforehand. This is to save time.
+        d_shadow = sprites.icon_shadow("namecard_icon_shadow", 64, scale_size((96, 96), scale))
+        draw_multi(image, d_shadow, (320, 170), [9, 3], [173, 70], scale)
+
+    if s_type == 'characters':
+        # Draws every background and shadow first. This is to save time.
+        draw_multi_c(image, '#9C8C72', 0, 255, 0, (300, 180), (96, 96), [9, 4], [130, 110], True, scale)
 
 
-# Draws either the characters or namecards showcase.
-def draw_showcase(image, s_type, showcase):
+# Draws the icons of either the characters or namecards showcase over its base from draw_showcase_base().
+def draw_showcase(image, s_type, showcase, scale=1):
+    icon_size = scale_size((96, 96), scale)
     v_offset = 0
     if s_type == 'namecards':
         # Initialises the showcase to Nones, if it is empty, so that we can print empty objects instead of nothing.
@@ -265,10 +272,6 @@ def draw_showcase(image, s_type, showcase):
         if len(showcase) < 9:
             showcase += [None] * (9 - len(showcase))
 
-        # Draws a shadow on all the namecard locations beforehand. This is to save time.
-        d_shadow = Image.open(f"./app/api/assets/namecard_icon_shadow.png").convert('RGBA')
-        draw_multi(image, d_shadow, 64, (320, 170), (96, 96), [9, 3], [173, 70])
-
         h_offset = -173
         for count in range(0,9):
             namecard = showcase[count]
@@ -279,16 +282,11 @@ def draw_showcase(image, s_type, showcase):
 
             # If the entire showcase is empty, we use a placeholder namecard icon instead.
             if namecard is None:
-                icon = Image.open(f"./app/api/assets/images/UI_NameCardIcon_0.png")
-            else:
-                icon = Image.open(f"./app/api/assets/images/{namecard}.png")
-            add_icon(image, icon, (320 + h_offset, 165 + v_offset), (96, 96))
+                namecard = "UI_NameCardIcon_0"
+            icon = get_icon(namecard, icon_size)
+            image.paste(icon, scale_loc((320 + h_offset, 165 + v_offset), scale), icon)
 
     if s_type == 'characters':
-        # Opens a dummy icon and draws every background and shadow first. This is to save time.
-        d_icon = Image.open(f"./app/api/assets/images/UI_AvatarIcon_PlayerBoy.png")
-        draw_multi_c(image, d_icon, '#9C8C72', 0, 255, 0, (300, 180), (96, 96), [9, 4], [130, 110], True)
-
         h_offset = -130
         for count, character in enumerate(showcase):
             h_offset += 130
@@ -300,73 +298,143 @@ def draw_showcase(image, s_type, showcase):
             if len(showcase) == 0:
                 continue
 
-            icon = Image.open(f"./app/api/assets/images/{character}.png")
-            add_icon_c(image, icon, (300 + h_offset, 180 + v_offset), (96, 96))
+            add_icon_c(image, character, scale_loc((300 + h_offset, 180 + v_offset), scale), icon_size)
+
+        draw_multi_c(image, 0, '#F0D6A9', 255, 20, (300, 180), (96, 96), [9, 4], [130, 110], scale=scale)
+
+
+# The base layers of profile cards, which are shared by every player with the same namecard, showcase type and size.
+base_layers = ImageCache(64 * 1024 * 1024)
+
+
+# Draws everything on a profile card that only depends on its namecard, showcase type and scale.
+# None of it overlaps the player's own text and icons, so drawing it first gives the same card as drawing it in order.
+def draw_base_layer(namecard, s_type, scale=1):
+    # Scales the namecard down to the card's size and darkens it.
+    profile_card = open_icon(namecard)
+    if scale != 1:
+        p_size = profile_card.size
+        profile_card = profile_card.resize((int(p_size[0] * scale), int(p_size[1] * scale)),
+                                           resample=Image.Resampling.LANCZOS)
+    profile_card = imageops.scale(profile_card, 0.55)
+
+    draw_statistic_names(profile_card, scale)
+    add_gradient_line(profile_card, [255, 255, 255], [240, 214, 169], scale_loc((35, 365,  75, 365), scale), 3 * scale)
+    add_gradient_line(profile_card, [255, 255, 255], [240, 214, 169], scale_loc((240, 110, 240, 150), scale), 3 * scale)
+
+    if s_type != "":
+        add_label(profile_card, '#F0D6A9', s_type.capitalize(), scale_loc((695, 133), scale), scale_length(15, scale))
+        add_gradient_line(profile_card, [255, 255, 255], [240, 214, 169], scale_loc((697, 160, 780, 160), scale),
+                          3 * scale)
+        draw_showcase_base(profile_card, s_type, scale)
+
+    # Draws the Genshin Impact logo in the top right.
+    image = sprites.resized_image("genshin_impact_logo", scale_size((86, 31), scale))
+    profile_card.paste(image, scale_loc((735, 15), scale), image)
+
+    return profile_card
 
-        draw_multi_c(image, d_icon, 0, '#F0D6A9', 255, 20, (300, 180), (96, 96), [9, 4], [130, 110])
+
+# Gets a copy of the base layer of a profile card, drawing it the first time it is needed.
+def get_base_layer(namecard, s_type, scale=1):
+    return base_layers.get_built((namecard, s_type, scale), lambda: draw_base_layer(namecard, s_type, scale))
 
 
 # Generates a profile for a user based on the given parameters.
 # Takes a percentage in the variable 'size'.
-def generate_profile(user_info, user_icon, namecard, showcase, bg_colour, size):
-    profile_card = Image.open(f"./app/api/assets/images/{namecard}.png")
-    user_icon = Image.open(f"./app/api/assets/images/{user_icon}.png")
-
-    # Darkens entire namecard image.
-    profile_card = profile_card.point(lambda colour: colour * 0.55)
+# Smaller cards are drawn directly at their size, with every position, font and icon scaled to it, rather than being
+# drawn at full size and then scaled down.
+def generate_profile(user_info, user_icon, namecard, showcase, bg_colour, size, timer=null_timer):
+    with timer.stage('base'):
+        profile_card = get_base_layer(namecard, showcase[0], size)
 
     # Draws the username and signature.
     # Signatures have a maximum length of 50, so we split them into two lines on the 26th character.
-    signature = user_info['signature']
-    if len(signature) > 25:
-        signature = signature[:26] + '\n' + signature[26:]
-        # If a new line begins with a space, the space is removed.
-        if signature[27] == " ":
-            signature = signature[:27] + signature[28:]
-    add_text(profile_card, '#CCB998', user_info['username'], (238, 50), 40)
-    add_text(profile_card, '#A8977B', signature, (250, 110), 17)
-
-    # Draws the user statistics.
-    draw_statistics(profile_card, user_info)
-    add_gradient_line(profile_card, [255, 255, 255], [240, 214, 169], (35, 365,  75, 365), 3)
-    add_gradient_line(profile_card, [255, 255, 255], [240, 214, 169], (240, 110, 240, 150), 3)
+    with timer.stage('text'):
+        signature = user_info['signature']
+        if len(signature) > 25:
+            signature = signature[:26] + '\n' + signature[26:]
+            # If a new line begins with a space, the space is removed.
+            if signature[27] == " ":
+                signature = signature[:27] + signature[28:]
+        add_text(profile_card, '#CCB998', user_info['username'], scale_loc((238, 50), size), scale_length(40, size))
+        add_text(profile_card, '#A8977B', signature, scale_loc((250, 110), size), scale_length(17, size))
+
+        # Draws the user statistics.
+        draw_statistics(profile_card, user_info, size)
 
     # If the input icon colour is not a valid hex colour, default to the most dominant colour.
-    bg_valid = re.search(r'^#(?:[0-9a-fA-F]{3}){1,2}$', bg_colour)
-    if not bg_valid:
-        bg_colour = get_colour(user_icon)
+    with timer.stage('colour'):
+        bg_valid = re.search(r'^#(?:[0-9a-fA-F]{3}){1,2}$', bg_colour)
+        if not bg_valid:
+            bg_colour = get_icon_colour(user_icon)
 
     # Draws the user's main icon.
-    try:
-        add_icon_cf(profile_card, user_icon, bg_colour, '#F0D6A9', 255, 15, (40, 30), (160, 160))
-    except ValueError:
-        bg_colour = get_colour(user_icon)
-        add_icon_cf(profile_card, user_icon, bg_colour, '#F0D6A9', 255, 15, (40, 30), (160, 160))
+    # The border's width is relative to the circle's source size, so it is not scaled.
+    with timer.stage('icon'):
+        icon_loc = scale_loc((40, 30), size)
+        icon_size = scale_size((160, 160), size)
+        try:
+            add_icon_cf(profile_card, user_icon, bg_colour, '#F0D6A9', 255, 15, icon_loc, icon_size)
+        except ValueError:
+            bg_colour = get_icon_colour(user_icon)
+            add_icon_cf(profile_card, user_icon, bg_colour, '#F0D6A9', 255, 15, icon_loc, icon_size)
 
     # Generates the showcase for namecards or characters.
-    if showcase[0] != "":
-        add_text(profile_card, '#F0D6A9', showcase[0].capitalize(), (695, 133), 15)
-        add_gradient_line(profile_card, [255, 255, 255], [240, 214, 169], (697, 160, 780, 160), 3)
-        draw_showcase(profile_card, showcase[0], showcase[1])
+    with timer.stage('showcase'):
+        if showcase[0] != "":
+            draw_showcase(profile_card, showcase[0], showcase[1], size)
 
-    # Draws the Genshin Impact logo in the top right.
-    image = Image.open("./app/api/assets/genshin_impact_logo.png").convert("RGBA")
-    image = image.resize((86, 31), resample=Image.Resampling.LANCZOS)
-    profile_card.paste(image, (735, 15), image)
+    with timer.stage('mask'):
+        # Merges the alpha values into the RGB values to add compatibility with browsers.
+        profile_card = profile_card.convert("RGB")
+        profile_card = profile_card.convert("RGBA")
 
-    # Merges the alpha values into the RGB values to add compatibility with browsers.
-    profile_card = profile_card.convert("RGB")
-    profile_card = profile_card.convert("RGBA")
+        # Rounds the corners on the namecard.
+        namecard_mask = sprites.resized_image("namecard_mask", profile_card.size, 'L')
+        profile_card.putalpha(namecard_mask)
 
-    # Rounds the corners on the namecard.
-    namecard_mask = Image.open('./app/api/assets/namecard_mask.png')
-    namecard_mask = namecard_mask.convert('L')
-    profile_card.putalpha(namecard_mask)
+    return profile_card
 
-    # Resizes the image if needed.
-    if size != 1:
-        p_size = profile_card.size
-        profile_card = profile_card.resize((int(p_size[0] * size), int(p_size[1] * size)),
-                                           resample=Image.Resampling.LANCZOS)
 
-    return profile_card
+# Empties every cache of decoded and drawn images, so that cards are drawn from the new assets after they are updated.
+def clear():
+    image_cache.clear()
+    base_layers.clear()
+    sprites.clear()
+    fonts.clear()
+    get_icon_colour.cache_clear()
+
+
+# Renders every sprite used by the profile layout so that the first requests do not have to.
+def warm_sprites():
+    sprites.circle('#9C8C72', 0, 0, (96, 96), 255)
+    sprites.circle('#000000', 0, 20, (102, 96), 64)
+    sprites.circle(0, '#F0D6A9', 20, (96, 96), 255)
+    sprites.circle(0, '#F0D6A9', 15, (160, 160), 255)
+    sprites.circle_mask((96, 96))
+    sprites.circle_mask((160, 160))
+    sprites.icon_shadow("namecard_icon_shadow", 64, (96, 96))
+    sprites.resized_image("genshin_impact_logo", (86, 31))
+    sprites.resized_image("namecard_mask", (840, 400), 'L')
+    fonts.warm()
+
+    for loc in [(35, 365, 75, 365), (240, 110, 240, 150), (697, 160, 780, 160)]:
+        sprites.gradient_line((255, 255, 255), (240, 214, 169), loc, 3)
+
+
+# Decodes the images and draws the base layers used by most profile cards so that the first requests do not have to.
+def warm_images():
+    for name in ["UI_NameCardPic_0_P", "UI_NameCardIcon_0", "UI_AvatarIcon_PlayerBoy"]:
+        open_icon(name)
+
+    # The default namecard is used by every player who has not picked one.
+    for s_type in ['', 'characters', 'namecards']:
+        get_base_layer("UI_NameCardPic_0_P", s_type)
+
+
+# Calculates the dominant colour of every avatar icon so that requests never have to.
+def warm_colours():
+    for file_name in listdir("./app/api/assets/images"):
+        if file_name.startswith("UI_AvatarIcon_") and file_name.endswith(".png"):
+            get_icon_colour(file_name[:-4])
@@ -0,0 +1,111 @@
+from functools import lru_cache
+from math import ceil
+from PIL import Image, ImageDraw
+import numpy as np
+from app.api import imageops
+from app.api.images import open_image
+
+
+# The size of the source icons that circles are drawn at before being resized.
+source_size = (256, 256)
+
+
+# Draws a circle with the specified parameters.
+def draw_circle(mode, fill, outline, width, size, alpha=255):
+    # The size is initially set to 3x the requested size so that smoother curves can be created.
+    large_size = (size[0] * 3, size[1] * 3)
+    circle = Image.new(mode, large_size)
+
+    draw = ImageDraw.Draw(circle)
+    draw.ellipse((0, 0) + large_size, fill=fill, outline=outline, width=width)
+    circle = circle.resize(size, resample=Image.Resampling.LANCZOS)
+
+    # If the opacity needs to be changed, it is changed if the mode is compatible.
+    if mode != 'L' and alpha < 255:
+        imageops.flatten_alpha(circle, alpha)
+
+    return circle
+
+
+# Draws a line, with its colour set as a gradient, that has rounded edges as an anti-aliased RGBA tile.
+# vector -> the horizontal and vertical distance from the start of the line to its end, at any angle.
+# Every pixel's colour and coverage are calculated at once from its distance along and away from the line.
+# Returns the tile alongside the offset from the start of the line to the tile's top left corner.
+def draw_gradient_line(start_colour, end_colour, vector, width):
+    radius = width / 2
+    padding = ceil(radius) + 1
+    origin = (padding + max(0, -vector[0]), padding + max(0, -vector[1]))
+    tile_size = (abs(vector[0]) + padding * 2 + 1, abs(vector[1]) + padding * 2 + 1)
+
+    # Finds the position of every pixel's centre relative to the start of the line.
+    x_pos = np.arange(0, tile_size[0]) - origin[0]
+    y_pos = np.arange(0, tile_size[1]) - origin[1]
+    x_pos, y_pos = np.meshgrid(x_pos, y_pos)
+
+    # Finds how far along the line each pixel is, from 0 at the start to 1 at the end, and its distance from the line.
+    length_sq = vector[0] ** 2 + vector[1] ** 2
+    if length_sq == 0:
+        along = np.zeros(x_pos.shape)
+    else:
+        along = np.clip((x_pos * vector[0] + y_pos * vector[1]) / length_sq, 0, 1)
+    distance = np.hypot(x_pos - along * vector[0], y_pos - along * vector[1])
+
+    # Pixels are fully covered within the radius and fade out over the pixel beyond it.
+    coverage = np.clip(radius - distance + 0.5, 0, 1)
+    colours = np.array(start_colour) + (np.array(end_colour) - np.array(start_colour)) * along[..., None]
+
+    tile = np.dstack([np.rint(colours), np.rint(coverage * 255)]).astype(np.uint8)
+    return Image.fromarray(tile, 'RGBA'), (-origin[0], -origin[1])
+
+
+# The sprites below are rendered once per set of parameters and then reused by every request.
+# They are shared between requests, so they must only ever be pasted and never modified in place.
+
+# Gets an RGBA circle drawn at the source size and resized to the requested size.
+# This is used for icon backgrounds, borders and drop-shadows.
+@lru_cache(maxsize=256)
+def circle(fill, outline, width, size, alpha=255, c_size=source_size):
+    circle_image = draw_circle('RGBA', fill, outline, width, c_size, alpha)
+    return circle_image.resize(size, resample=Image.Resampling.LANCZOS)
+
+
+# Gets a greyscale circle mask of the requested size, used to round icons.
+@lru_cache(maxsize=16)
+def circle_mask(size):
+    return draw_circle('L', 255, 255, 0, size)
+
+
+# Gets a gradient line as a transparent tile, alongside the offset it should be pasted at from the start of the line.
+# Lines with the same colours, length, angle and width share a tile wherever they are drawn.
+# start_colour and end_colour must be tuples so that the line can be cached.
+@lru_cache(maxsize=32)
+def gradient_stroke(start_colour, end_colour, vector, width):
+    return draw_gradient_line(start_colour, end_colour, vector, width)
+
+
+# Gets a gradient line from (loc[0], loc[1]) to (loc[2], loc[3]) as a transparent tile, alongside its location.
+def gradient_line(start_colour, end_colour, loc, width):
+    tile, offset = gradient_stroke(start_colour, end_colour, (loc[2] - loc[0], loc[3] - loc[1]), width)
+    return tile, (loc[0] + offset[0], loc[1] + offset[1])
+
+
+# Gets an icon drop-shadow, with its opacity reduced, resized to the requested size.
+@lru_cache(maxsize=16)
+def icon_shadow(name, alpha, size):
+    shadow = open_image(name)
+    imageops.flatten_alpha(shadow, alpha, 1)
+
+    return shadow.resize(size, resample=Image.Resampling.LANCZOS)
+
+
+# Gets an image from the assets folder resized to the requested size, e.g. the Genshin Impact logo.
+@lru_cache(maxsize=16)
+def resized_image(name, size, mode='RGBA'):
+    image = open_image(name, mode)
+    return image.resize(size, resample=Image.Resampling.LANCZOS)
+
+
+# Empties every sprite cache, e.g. after the assets have been updated.
+def clear():
+    for sprite in [circle, circle_mask, gradient_stroke, icon_shadow, resized_image]:
+        sprite.cache_clear()
@@ -0,0 +1,60 @@
+import hashlib
+from flask import render_template
+
+
+# A file that is served from memory, with a strong ETag from its contents.
+class StaticFile:
+    def __init__(self, data, mimetype, max_age):
+        self.data = data
+        self.mimetype = mimetype
+        self.max_age = max_age
+        self.etag = hashlib.sha1(data).hexdigest()
+
+
+# Checks whether an If-None-Match header matches the given ETag.
+def etag_matches(if_none_match, etag):
+    for value in if_none_match.split(','):
+        value = value.strip()
+        if value.startswith('W/'):
+            value = value[2:]
+        if value == '*' or value.strip('"') == etag:
+            return True
+
+    return False
+
+
+# The error images and the index page, which are loaded once when the application starts.
+# Responses are built from memory, so serving them never touches the filesystem.
+# This is shared by the Flask routes and the ASGI entry point, so both send the same headers.
+class StaticFiles:
+    def __init__(self, max_age=86400):
+        self.max_age = max_age
+        self.files = {}
+
+    def add(self, name, data, mimetype):
+        self.files[name] = StaticFile(data, mimetype, self.max_age)
+
+    # Loads the error images and renders the index page, which only depends on the application's routes.
+    def load(self, app):
+        for showcase in ['profile', 'characters', 'namecards']:
+            with open(f"{app.root_path}/error_{showcase}.png", 'rb') as file:
+                self.add(f"error_{showcase}", file.read(), 'image/png')
+
+        with app.test_request_context('/'):
+            self.add('index', render_template('index.html').encode('utf-8'), 'text/html; charset=utf-8')
+
+    # Gets the response to a request for a file as (status, headers, body).
+    # A 304 is sent instead if the If-None-Match header matches the file's ETag.
+    # max_age -> how long, in seconds, the response may be cached for, if not the file's own lifetime.
+    def get_response(self, name, if_none_match='', max_age=None):
+        file = self.files[name]
+        headers = [('ETag', f'"{file.etag}"'),
+                   ('Cache-Control', f"public, max-age={file.max_age if max_age is None else max_age}")]
+
+        if etag_matches(if_none_match, file.etag):
+            return 304, headers, b''
+
+        return 200, [('Content-Type', file.mimetype)] + headers, file.data
+
+
+static_files = StaticFiles()
@@ -0,0 +1,54 @@
+# The sizes that profile cards are drawn at, from largest to smallest. If it is empty, every size is drawn directly.
+# Base layers and resized icons are cached for each size they are drawn at, so a fixed set of sizes bounds them.
+size_tiers = [1.0, 0.75, 0.5, 0.25]
+
+# How sizes that are not one of the tiers are served:
+# derive -> the card is drawn at the next larger tier and then resized to the requested size, and the tier's card is
+#           cached from the same drawing.
+# snap -> the card is served at the next larger tier instead, so it shares that tier's cached card.
+size_mode = 'derive'
+
+# Whether a rendered full size card is followed by rendering and caching the card at every smaller tier.
+ladder = False
+
+
+# Sets the size tiers and how they are used from the application's config.
+# Full size is always a tier, so every valid size has a tier at least as large as it.
+def configure(tiers, mode='derive', use_ladder=False):
+    global size_tiers, size_mode, ladder
+
+    if mode not in ['derive', 'snap']:
+        raise ValueError(f"Unknown size mode: {mode}")
+
+    size_tiers = sorted({float(tier) for tier in tiers if 0 < float(tier) < 1} | {1.0}, reverse=True) if tiers else []
+    size_mode = mode
+    ladder = use_ladder
+
+
+# Gets the smallest tier that is at least the given size, or None if there are no tiers.
+def get_tier(size):
+    larger = [tier for tier in size_tiers if tier >= size]
+    return min(larger) if larger else None
+
+
+# Gets the size a card is served at, which is its tier if sizes are snapped to them.
+def get_served_size(size):
+    if size_mode == 'snap' and size_tiers:
+        return get_tier(size)
+    return size
+
+
+# Gets the tier that a card is resized from, or None if it is drawn at its own size.
+def get_source_tier(size):
+    if size_mode != 'derive':
+        return None
+
+    tier = get_tier(size)
+    return tier if tier != size else None
+
+
+# Gets the smaller tiers to render alongside a card, which are every other tier for a full size card with the ladder on.
+def get_ladder(size):
+    if not ladder or size != 1:
+        return []
+    return [tier for tier in size_tiers if tier != 1]
@@ -0,0 +1,31 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+
+# Records how long each stage of generating a profile card takes, in seconds.
+# Stages that are entered more than once have their times added together.
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0) + time.perf_counter() - start
+
+
+# A timer that records nothing, used when a card's stages do not need to be timed.
+# Its stages are always empty, so it can be read in the same way as a StageTimer.
+class NullTimer:
+    def __init__(self):
+        self.stages = {}
+        self._context = nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+
+null_timer = NullTimer()
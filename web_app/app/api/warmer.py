@@ -0,0 +1,234 @@
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl
+import numpy as np
+from app.api import cards, encoding
+from app.api.admission import admission
+from app.api.cache import response_cache
+from app.api.cards import CardError
+from app.api.players import player_cache
+
+
+# The /genshin requests in an access log, in the common or combined log format used by gunicorn and nginx.
+request_line = re.compile(r'"(?:GET|HEAD) /genshin\?(\S*) HTTP/[\d.]+"')
+
+# The request parameters that identify a card, in the order they are kept in a card's item.
+card_fields = ['userid', 'showcase', 'bg_colour', 'size', 'format']
+
+
+# Gets the item that a card is counted by from its parameters given by cards.parse_args().
+def get_item(params):
+    return tuple(params[field] for field in card_fields)
+
+
+# Estimates how many times each item has been seen, in a fixed amount of memory.
+# Every item is counted in one cell of each row, and its estimate is the smallest of them, which can only be too high.
+class CountMinSketch:
+    def __init__(self, width=4096, depth=4):
+        self.width = width
+        self.depth = depth
+        self.counts = np.zeros((depth, width), dtype=np.uint32)
+
+    # Gets the cell of an item in every row, from a single hash of the item.
+    def _cells(self, item):
+        digest = hashlib.blake2b(repr(item).encode('utf-8'), digest_size=4 * self.depth).digest()
+        return np.frombuffer(digest, dtype=np.uint32) % self.width
+
+    # Counts an item, returning its new estimate.
+    def add(self, item):
+        cells = self._cells(item)
+        rows = np.arange(self.depth)
+        self.counts[rows, cells] += 1
+        return int(self.counts[rows, cells].min())
+
+    def estimate(self, item):
+        return int(self.counts[np.arange(self.depth), self._cells(item)].min())
+
+    # Halves every count, so that items that were popular long ago are overtaken by ones that are popular now.
+    def decay(self):
+        self.counts >>= 1
+
+
+# Keeps the k items with the highest estimates from a count-min sketch.
+class TopK:
+    def __init__(self, k=100, sketch=None):
+        self.k = k
+        self.sketch = sketch if sketch is not None else CountMinSketch()
+
+        # _items -> {item: estimate}
+        # _floor -> a lower bound on the smallest estimate in _items, so most items can be skipped without a search.
+        self._items = {}
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def add(self, item):
+        with self._lock:
+            estimate = self.sketch.add(item)
+            if item in self._items or len(self._items) < self.k:
+                self._items[item] = estimate
+                return
+            if estimate <= self._floor:
+                return
+
+            smallest = min(self._items, key=self._items.get)
+            self._floor = self._items[smallest]
+            if estimate > self._floor:
+                del self._items[smallest]
+                self._items[item] = estimate
+
+    # Gets the items from most to least popular.
+    def items(self):
+        with self._lock:
+            return sorted(self._items, key=self._items.get, reverse=True)
+
+    def decay(self):
+        with self._lock:
+            self.sketch.decay()
+            self._items = {item: self.sketch.estimate(item) for item in self._items}
+            self._floor = min(self._items.values(), default=0)
+
+
+# Keeps the most requested cards rendered in the response cache, so that popular cards are almost never rendered for
+# a request.
+# - Every valid /genshin request is counted by its card's parameters.
+# - Every interval seconds, the top cards are fetched again and re-rendered before their cached cards expire.
+# - Cards are rendered by the warmer's own renderer processes, and it stops early whenever live requests are using
+#   every render slot, so it cannot starve live traffic.
+# Every worker counts its own requests, so each warms the cards that are popular with its own traffic.
+# The warmer is started by the first request a worker records, so it also runs in workers forked by a preloading server.
+# replay_path -> an access log to replay before the first cycle, if any.
+class Warmer:
+    def __init__(self, enabled=False, top=100, interval=60, processes=1, ttl=300, replay_path=None):
+        self.enabled = enabled
+        self.top = TopK(top)
+        self.interval = interval
+        self.processes = processes
+        self.ttl = ttl
+        self.replay_path = replay_path
+
+        self.warmed = 0
+        self.cycles = 0
+
+        # _rendered -> {cache key: when the warmer last rendered it}
+        self._rendered = {}
+        self._renderer = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # Counts a request for a card from its parameters given by cards.parse_args().
+    def record(self, params):
+        if not self.enabled:
+            return
+
+        if self._thread is None:
+            self.start()
+        self.top.add(get_item(params))
+
+    # Counts every /genshin request in an access log, e.g. to warm the cards that were popular before a deploy.
+    # Returns the number of requests that were counted.
+    def replay(self, filepath):
+        count = 0
+        with open(filepath, 'r', encoding='utf-8', errors='replace') as file:
+            for line in file:
+                match = request_line.search(line)
+                if match is None:
+                    continue
+
+                args = {}
+                for name, value in parse_qsl(match.group(1)):
+                    args.setdefault(name, value)
+                try:
+                    params = cards.parse_args(args)
+                except CardError:
+                    continue
+                self.top.add(get_item(params))
+                count += 1
+
+        return count
+
+    # Checks whether a card should be rendered again, as it is not cached or will expire before the next cycle.
+    # Cards rendered by live requests are not known to the warmer, so they are rendered again once when they are hot.
+    def is_due(self, key, now):
+        rendered = self._rendered.get(key)
+        if rendered is None or now - rendered >= self.ttl - 2 * self.interval:
+            return True
+        return response_cache.get(key) is None
+
+    # Fetches the hottest cards' player data and renders any that are due.
+    # Returns the number of cards that were rendered.
+    def warm(self):
+        now = time.monotonic()
+        renders = []
+        for item in self.top.items():
+            params = dict(zip(card_fields, item))
+
+            user_data = player_cache.get(params['userid'])
+            try:
+                cards.check_user_data(params, user_data)
+            except CardError:
+                continue
+
+            key = cards.get_card_key(params, user_data)
+            if self.is_due(key, now):
+                renders.append((key, params['format'], cards.get_render_args(params, user_data)))
+
+        if renders and self._renderer is None:
+            self._renderer = ProcessPoolExecutor(self.processes, initializer=cards.init_renderer)
+
+        # No more cards are rendered than there are renderer processes at once, and warming stops as soon as live
+        # requests are using every render slot.
+        warmed = 0
+        for start in range(0, len(renders), self.processes):
+            if 0 < admission.max_renders <= admission.in_flight:
+                break
+
+            chunk = renders[start:start + self.processes]
+            futures = [self._renderer.submit(cards.render_card, render_args, fmt) for key, fmt, render_args in chunk]
+            for (key, fmt, render_args), future in zip(chunk, futures):
+                try:
+                    data = future.result()
+                except Exception:
+                    continue
+                response_cache.set(key, key, encoding.mimetypes[fmt], data)
+                self._rendered[key] = time.monotonic()
+                warmed += 1
+
+        # Forgets cards that the warmer has not rendered for a while, so that _rendered does not grow forever.
+        self._rendered = {key: rendered for key, rendered in self._rendered.items() if now - rendered < self.ttl}
+        self.warmed += warmed
+        self.cycles += 1
+        return warmed
+
+    # Warms the cache every interval seconds, after replaying the access log if there is one.
+    def run(self):
+        if self.replay_path:
+            try:
+                self.replay(self.replay_path)
+            except OSError:
+                pass
+
+        while True:
+            try:
+                self.warm()
+            except Exception:
+                pass
+            self.top.decay()
+            time.sleep(self.interval)
+
+    # Starts warming the cache in a background thread.
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        return {'cycles': self.cycles, 'warmed': self.warmed, 'tracked': len(self.top.items())}
+
+
+warmer = Warmer()
@@ -0,0 +1,171 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, wait
+from urllib.parse import parse_qsl
+from app import app
+from app.api import cards, encoding
+from app.api.cache import response_cache
+from app.api.cards import CardError
+from app.api.players import player_cache
+from app.api.static import etag_matches, static_files
+
+
+# Renders profile cards in a pool of warm renderer processes, so that rendering scales with the number of cores.
+# Once queue_depth cards are being rendered or waiting to be rendered, further cards are refused.
+class RenderService:
+    def __init__(self, processes, queue_depth):
+        self.processes = processes
+        self.queue_depth = queue_depth
+        self.in_flight = 0
+        self.pool = None
+
+    # Starts the renderer processes and waits for them to load their assets.
+    def start(self):
+        if self.pool is not None:
+            return
+
+        self.pool = ProcessPoolExecutor(self.processes, initializer=cards.init_renderer)
+        wait([self.pool.submit(cards.init_renderer) for empty_var in range(0, self.processes)])
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    # Checks whether another card can be rendered without going over the queue depth.
+    def is_saturated(self):
+        return self.in_flight >= self.queue_depth
+
+    # Runs a function in one of the renderer processes.
+    async def run(self, function, *args):
+        self.start()
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, function, *args)
+        finally:
+            self.in_flight -= 1
+
+    # Renders a card in one of the renderer processes.
+    async def render(self, render_args, fmt):
+        return await self.run(cards.render_card, render_args, fmt)
+
+
+render_service = RenderService(app.config['RENDER_PROCESSES'], app.config['RENDER_QUEUE_DEPTH'])
+
+
+# Sends a complete HTTP response.
+async def send_response(send, status, headers, body=b''):
+    headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    headers.append((b'content-length', str(len(body)).encode('latin-1')))
+
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+# Gets the headers sent alongside a profile card so that browsers and CDNs can revalidate it.
+def get_card_headers(etag):
+    return [('etag', f'"{etag}"'), ('cache-control', f"public, max-age={app.config['RESPONSE_MAX_AGE']}"),
+            ('vary', 'Accept')]
+
+
+# Sends a file from memory, with the same headers as the Flask routes.
+async def send_static(scope, send, name, max_age=None):
+    if_none_match = dict(scope['headers']).get(b'if-none-match', b'').decode('latin-1')
+    status, headers, body = static_files.get_response(name, if_none_match, max_age)
+    await send_response(send, status, [(name.lower(), value) for name, value in headers], body)
+
+
+# Sends a placeholder error image if any invalid parameters are entered.
+# Errors that may go away, e.g. a player whose data could not be found, are cached no longer than a card would be.
+async def send_error_image(scope, send, error):
+    showcase = error.showcase
+    if showcase == "":
+        showcase = "profile"
+
+    await send_static(scope, send, f"error_{showcase}", None if error.permanent else app.config['RESPONSE_MAX_AGE'])
+
+
+# Generates a profile card with the same parameters as the Flask /genshin route.
+async def get_profile(scope, send):
+    # Only the first value of each parameter is used, as with Flask's request.args.get().
+    args = {}
+    for name, value in parse_qsl(scope['query_string'].decode('latin-1')):
+        args.setdefault(name, value)
+
+    headers = dict(scope['headers'])
+    try:
+        params = cards.parse_args(args, headers.get(b'accept', b'').decode('latin-1'))
+
+        # Player data is fetched in a thread so the event loop is free to serve other requests meanwhile.
+        user_data = await asyncio.to_thread(player_cache.get, params['userid'])
+        cards.check_user_data(params, user_data)
+    except CardError as error:
+        return await send_error_image(scope, send, error)
+
+    # If the card has already been rendered for the user's current data, it is not rendered again.
+    key = cards.get_card_key(params, user_data)
+    if etag_matches(headers.get(b'if-none-match', b'').decode('latin-1'), key):
+        return await send_response(send, 304, get_card_headers(key))
+    cached_image = response_cache.get(key)
+    if cached_image is not None:
+        etag, mimetype, data = cached_image
+        return await send_response(send, 200, [('content-type', mimetype)] + get_card_headers(etag), data)
+
+    # If the renderers are saturated, the client is asked to try again shortly.
+    if render_service.is_saturated():
+        return await send_response(send, 503, [('retry-after', '1'), ('content-type', 'text/plain')],
+                                   b'Service busy, please try again shortly.')
+
+    mimetype = encoding.mimetypes[params['format']]
+    tier_params, tier = cards.get_tier_params(params)
+    tier_key = cards.get_card_key(tier_params, user_data) if tier is not None else None
+    ladder_keys = [(size, ladder_key) for size, ladder_key in cards.get_ladder_keys(params, user_data)
+                   if response_cache.get(ladder_key) is None]
+    render_args = cards.get_render_args(params, user_data)
+
+    # A card between the tiers is resized from a drawing of its tier, whose card is cached as well if it is not already.
+    # The smaller tiers of a full size card's ladder are drawn in the same call as the card, so it is only drawn once.
+    if tier is not None:
+        data, tier_data = await render_service.run(cards.render_derived, render_args, params['format'],
+                                                   response_cache.get(tier_key) is None)
+        if tier_data is not None:
+            response_cache.set(tier_key, tier_key, mimetype, tier_data)
+    elif ladder_keys:
+        sizes, keys = zip(*ladder_keys)
+        data, ladder_data = await render_service.run(cards.render_card_ladder, render_args, sizes, params['format'])
+        for ladder_key, ladder_card in zip(keys, ladder_data):
+            response_cache.set(ladder_key, ladder_key, mimetype, ladder_card)
+    else:
+        data = await render_service.render(render_args, params['format'])
+    response_cache.set(key, key, mimetype, data)
+
+    await send_response(send, 200, [('content-type', mimetype)] + get_card_headers(key), data)
+
+
+# Starts and stops the renderer processes alongside the server.
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await asyncio.to_thread(render_service.start)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.to_thread(render_service.stop)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+# An ASGI entry point for the /genshin route, e.g. 'uvicorn app.asgi:application' from the web_app folder.
+# Player data is awaited on the event loop, while cards are rendered by a pool of renderer processes.
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await handle_lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    if scope['path'] == '/genshin' and scope['method'] in ['GET', 'HEAD']:
+        return await get_profile(scope, send)
+    if scope['path'] == '/' and scope['method'] in ['GET', 'HEAD']:
+        return await send_static(scope, send, 'index')
+
+    await send_response(send, 404, [('content-type', 'text/plain')], b'Not found.')
@@ -1,163 +1,163 @@
-from flask import send_file, request, render_template, send_from_directory, json
+from concurrent.futures import ThreadPoolExecutor
+from flask import request, make_response
 from app import app
-from app.api import profiles
-import cloudscraper
-from io import BytesIO
-import time
+from app.api import cards, encoding
+from app.api.admission import AdmissionError, admission
+from app.api.cache import response_cache
+from app.api.cards import CardError
+from app.api.metrics import get_server_timing, metrics
+from app.api.players import player_cache
+from app.api.static import static_files
+from app.api.timing import StageTimer
+from app.api.warmer import warmer
 
 
-# Sends the profile card based on the input parameters.
-def send_image(user_info, user_icon, namecard, showcase, bg_colour, size):
-    start = time.process_time()
-    image = profiles.generate_profile(user_info, user_icon, namecard, showcase, bg_colour, size)
+# Sends an encoded profile card with an ETag so that browsers and CDNs can revalidate it.
+def send_image(etag, mimetype, data):
+    response = make_response(data)
+    response.mimetype = mimetype
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['RESPONSE_MAX_AGE']
+    response.vary.add('Accept')
 
-    image_out = BytesIO()
-    image.save(image_out, 'PNG')
-    image_out.seek(0)
+    return response
 
-    return send_file(image_out, mimetype='image/png')
+
+# Tells the client that its copy of the profile card is still valid, without rendering it again.
+def send_not_modified(etag):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['RESPONSE_MAX_AGE']
+    response.vary.add('Accept')
+
+    return response
+
+
+# Sends a file from memory, or a 304 if the client's copy is still valid.
+def send_static(name, max_age=None):
+    status, headers, body = static_files.get_response(name, request.headers.get('If-None-Match', ''), max_age)
+    return make_response(body, status, headers)
 
 
 # Sends a placeholder error image if any invalid parameters are entered.
-def send_error_image(showcase):
+# Errors that may go away, e.g. a player whose data could not be found, are cached no longer than a card would be.
+def send_error_image(error):
+    showcase = error.showcase
     if showcase == "":
         showcase = "profile"
+    metrics.inc('genshin_error_images_total', showcase=showcase)
+
+    return send_static(f"error_{showcase}", None if error.permanent else app.config['RESPONSE_MAX_AGE'])
+
+
+# Asks the client to try again later, when a request is refused by the admission control.
+def send_refused(error):
+    response = make_response("Too many requests, please try again shortly." if error.status == 429 else
+                             "Service busy, please try again shortly.", error.status)
+    response.mimetype = 'text/plain'
+    response.headers['Retry-After'] = str(error.retry_after)
 
-    return send_file(f"error_{showcase}.png", mimetype="image/png")
-
-
-# Gets the filename required for images based on their file type and IDs.
-def get_filename(f_type, f_ids, i_type):
-    # Sets the identifier to grab the names from.
-    if i_type == "icon":
-        identifier = 'iconName'
-    if i_type == "image":
-        identifier = 'imageName'
-
-    # Gets the json required based on the input file type.
-    filepath = "./app/api/assets/json"
-    if f_type == "characters":
-        data_json = json.load(open(f"{filepath}/Characters.json", "r"))
-    if f_type == "namecards":
-        data_json = json.load(open(f"{filepath}/Namecards.json", "r"))
-
-    # Stores the icon names into a list by iterating through the input file IDs.
-    data_list = []
-    for f_id in f_ids:
-        # If the length of f_id is over 1, it contains a costume ID too.
-        if f_id[0] in data_json:
-            if len(f_id) > 1:
-                data = data_json[f_id[0]]['costumes'][f_id[1]]
-            else:
-                data = data_json[f_id[0]]
-
-            # Appends the icon's name into the list.
-            data_list.append(str(data[identifier]))
-
-        else:
-            if f_type == "characters":
-                data_list.append("UI_AvatarIcon_PlayerBoy")
-            if f_type == "namecards":
-                if i_type == "icon":
-                    data_list.append("UI_NameCardIcon_0")
-                if i_type == "image":
-                    data_list.append("UI_NameCardPic_0_P")
-
-    return data_list
+    return response
 
 
 # Generates a profile card for users if they enter the following parameters:
 # userid -> the user's Genshin Impact UserID.
 # showcase -> 'characters' or 'namecards' or '' for the type of showcase the user wants.
 # icon -> the colour the user wants to use for their main icon, this is set to the most dominant colour if empty.
+# size -> a percentage of the full card size, see app/api/tiers.py for how it is drawn.
+# format -> 'png', 'png8', 'webp' or 'avif', otherwise it is picked from the Accept header.
 @app.route('/genshin', methods=['GET'])
 def get_profile():
-    # Gets the three parameters from the request to the website.
-    userid = request.args.get('userid', '')
-    showcase = request.args.get('showcase', '')
-    bg_colour = request.args.get('icon', '')
-    size = request.args.get('size', '1')
-
-    # If the showcase's value is not valid, the user is redirected elsewhere.
-    if showcase not in ['characters', 'namecards', '']:
-        return send_error_image('')
-    # If an invalid userid is entered, the user is redirected elsewhere.
-    if len(userid) != 9 or not userid.isnumeric():
-        return send_error_image(showcase)
-    # Converts the size to a float if it is possible.
+    # Every stage of the request is timed for the metrics or the Server-Timing header, unless both are disabled.
+    timer = StageTimer() if app.config['SERVER_TIMING'] else metrics.get_timer()
+    with timer.stage('total'):
+        response, outcome = make_profile(timer)
+    metrics.record_request(outcome, timer)
+
+    server_timing = get_server_timing(timer)
+    if app.config['SERVER_TIMING'] and server_timing:
+        response.headers['Server-Timing'] = server_timing
+
+    return response
+
+
+# Gets the response to a /genshin request, alongside how it was served for the metrics.
+def make_profile(timer):
+    try:
+        admission.admit(request.remote_addr)
+    except AdmissionError as error:
+        return send_refused(error), 'limited'
+
+    try:
+        params = cards.parse_args(request.args, request.headers.get('Accept', ''))
+        warmer.record(params)
+
+        # Gets the user's data from the Enka Network API, through the player cache.
+        with timer.stage('fetch'):
+            user_data = player_cache.get(params['userid'])
+        cards.check_user_data(params, user_data)
+    except CardError as error:
+        return send_error_image(error), 'error'
+
+    # If the card has already been rendered for the user's current data, it is not rendered again.
+    key = cards.get_card_key(params, user_data)
+    if key in request.if_none_match:
+        return send_not_modified(key), 'not_modified'
+    with timer.stage('cache'):
+        cached_image = response_cache.get(key)
+    if cached_image is not None:
+        return send_image(*cached_image), 'cached'
+
+    # Identical requests that arrive during the render wait for it, rather than rendering the card again.
+    try:
+        data, coalesced = admission.render(params['userid'], key, lambda: render_profile(params, user_data, key, timer))
+    except AdmissionError as error:
+        return send_refused(error), 'limited' if error.status == 429 else 'overloaded'
+    mimetype = encoding.mimetypes[params['format']]
+
+    return send_image(key, mimetype, data), 'coalesced' if coalesced else 'rendered'
+
+
+# Renders the smaller size tiers of full size cards in the background, one ladder at a time.
+ladder_pool = ThreadPoolExecutor(1)
+
+
+# Renders and caches a card that is not cached yet.
+# A card between the tiers is resized from a drawing of its tier, whose card is cached as well if it is not already.
+def render_profile(params, user_data, key, timer):
+    mimetype = encoding.mimetypes[params['format']]
+    tier_params, tier = cards.get_tier_params(params)
+    tier_key = cards.get_card_key(tier_params, user_data) if tier is not None else None
+    ladder_keys = cards.get_ladder_keys(params, user_data)
+    render_args = cards.get_render_args(params, user_data, timer)
+
+    if tier is None:
+        data = cards.render_card(render_args, params['format'], timer)
+    else:
+        tier_cached = response_cache.get(tier_key) is not None
+        data, tier_data = cards.render_derived(render_args, params['format'], not tier_cached, timer)
+        if tier_data is not None:
+            response_cache.set(tier_key, tier_key, mimetype, tier_data)
+    response_cache.set(key, key, mimetype, data)
+
+    # The smaller size tiers of a full size card are drawn after it has been sent, each ladder taking one of the render
+    # slots, so that ladders are skipped rather than queued while the server is busy.
+    if ladder_keys and admission.acquire():
+        ladder_pool.submit(cache_ladder, ladder_keys, render_args, params['format'])
+
+    return data
+
+
+# Caches the smaller size tiers of a full size card, giving back the render slot taken for it.
+def cache_ladder(ladder_keys, render_args, fmt):
     try:
-        size = float(size)
-    except ValueError:
-        return send_error_image(showcase)
-    if size > 1 or size <= 0:
-        return send_error_image(showcase)
-
-    # Adds a hashtag to the input colour value.
-    bg_colour = "#" + bg_colour
-
-    # Gets the user's data from the Enka Network API. If the user does not exist, the user is redirected elsewhere.
-    user_data = cloudscraper.create_scraper(browser={'browser': 'firefox','platform': 'windows','mobile': False})
-    user_data = user_data.get(f"https://enka.shinshin.moe/u/{userid}/__data.json").json()
-    if 'playerInfo' not in user_data:
-        return send_error_image(showcase)
-    user_data = user_data['playerInfo']
-
-    # Grabs the player's user icon and namecard names.
-    if 'avatarId' not in user_data['profilePicture'] or 'nameCardId' not in user_data:
-        return send_error_image(showcase)
-
-    user_icon = user_data['profilePicture']
-    user_icon['avatarId'] = [str(user_icon['avatarId'])]
-
-    # The icon for a skin is used if the user is using a skin in their icon.
-    if 'costumeId' in user_icon:
-        user_icon['avatarId'].append(str(user_icon['costumeId']))
-
-    user_icon = get_filename('characters', [user_icon['avatarId']], "icon")[0]
-    namecard = get_filename('namecards', [[str(user_data['nameCardId'])]], "image")[0]
-
-    # Gets the showcase icon names based on the input showcase type.
-    showcase = (showcase, [])
-    if not showcase[0] == "":
-        if showcase[0] == "namecards":
-            if "showNameCardIdList" in user_data:
-                showcase_list = user_data["showNameCardIdList"]
-                for count, data in enumerate(showcase_list):
-                    showcase_list[count] = [str(data)]
-            else:
-                showcase_list = []
-        if showcase[0] == "characters":
-            if "showAvatarInfoList" in user_data:
-                showcase_list = user_data["showAvatarInfoList"]
-                for count, data in enumerate(showcase_list):
-                    showcase_list[count] = [str(data['avatarId'])]
-                    if 'costumeId' in data:
-                        showcase_list[count].append(str(data['costumeId']))
-            else:
-                showcase_list = []
-
-        showcase = (showcase[0], get_filename(showcase[0], showcase_list, "icon"))
-
-    # If the following values aren't defined, they are replaced with a placeholder value.
-    user_info = {'username': '?',
-                 'signature': '(No signature)',
-                 'rank': '?',
-                 'abyss': '?',
-                 'achievements': '?'}
-    if 'nickname' in user_data:
-        user_info['username'] = user_data['nickname']
-    if 'signature' in user_data:
-        user_info['signature'] = user_data['signature']
-    if 'level' in user_data:
-        user_info['rank'] = str(user_data['level'])
-    if 'towerFloorIndex' in user_data:
-        user_info['abyss'] = str(user_data['towerFloorIndex']) + "-" + str(user_data['towerLevelIndex'])
-    if 'finishAchievementNum' in user_data:
-        user_info['achievements'] = str(user_data['finishAchievementNum'])
-
-    return send_image(user_info, user_icon, namecard, showcase, bg_colour, size)
+        cards.cache_ladder(ladder_keys, render_args, fmt)
+    finally:
+        admission.release()
 
 
 @app.route('/')
 def main_page():
-    return render_template('index.html')
\ No newline at end of file
+    return send_static('index')
\ No newline at end of file
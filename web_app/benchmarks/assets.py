@@ -0,0 +1,54 @@
+import argparse
+import json
+import time
+import tracemalloc
+from app.api import assets
+
+# Run from the web_app folder, e.g.
+# python -m benchmarks.assets --iterations 5
+
+
+# Keeps the namecards of the material config by loading the whole file, as generate_namecards() did before.
+def load_namecards(filepath):
+    materials_json = json.load(open(filepath, "r", encoding="utf-8"))
+    return [material for material in materials_json if material.get('materialType') == "MATERIAL_NAMECARD"]
+
+
+# Keeps the namecards of the material config by reading its items one at a time.
+def stream_namecards(filepath):
+    return [material for material in assets.iter_json_array(filepath)
+            if material.get('materialType') == "MATERIAL_NAMECARD"]
+
+
+# Runs a reader over a file, measuring the time it takes and the most memory it holds at once.
+def measure(reader, filepath, iterations):
+    durations = []
+    for empty_var in range(0, iterations):
+        start = time.perf_counter()
+        reader(filepath)
+        durations.append(time.perf_counter() - start)
+
+    # Memory is traced in a separate run, as tracing slows down the reader.
+    tracemalloc.start()
+    namecards = reader(filepath)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'reader': reader.__name__, 'items': len(namecards), 'mean_ms': sum(durations) / len(durations) * 1000,
+            'peak_mb': peak_bytes / 1024 / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares loading and streaming the Excel config files.")
+    parser.add_argument("--iterations", type=int, default=5, help="how many times each file is read")
+    args = parser.parse_args()
+
+    filepath = f"{assets.assets_path}/json/MaterialExcelConfigData.json"
+    for reader in [load_namecards, stream_namecards]:
+        result = measure(reader, filepath, args.iterations)
+        print(f"{result['reader']:<17} {result['items']} namecards, mean {result['mean_ms']:.1f}ms, "
+              f"peak {result['peak_mb']:.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+import argparse
+import json
+import random
+import resource
+import sys
+import time
+from os import path
+from app.api import cards
+from app.api.catalog import catalog
+from app.api.timing import StageTimer
+
+# Run from the web_app folder, e.g.
+# python -m benchmarks.cards --output baseline.json
+# python -m benchmarks.cards --check baseline.json --tolerance 0.2
+
+
+# Checks whether an image exists in the assets folder.
+def has_image(name):
+    return path.exists(f"./app/api/assets/images/{name}.png")
+
+
+# Builds a fixed corpus of render arguments from the real assets, so that every run renders the same cards.
+def get_corpus(count, seed=0):
+    random_gen = random.Random(seed)
+    tables = catalog._tables
+    avatars = sorted(name for name in set(tables[('characters', 'icon')].values()) if has_image(name))
+    namecard_icons = sorted(name for name in set(tables[('namecards', 'icon')].values()) if has_image(name))
+    namecard_images = sorted(name for name in set(tables[('namecards', 'image')].values()) if has_image(name))
+
+    corpus = []
+    for index in range(0, count):
+        user_info = {'username': random_gen.choice(['Traveler', 'Lumine', 'Aether', 'パイモン', 'Venti']),
+                     'signature': random_gen.choice(['(No signature)', 'Ad astra abyssosque! ' * 2]),
+                     'rank': str(random_gen.randint(1, 60)),
+                     'abyss': f"{random_gen.randint(1, 12)}-{random_gen.randint(1, 3)}",
+                     'achievements': str(random_gen.randint(0, 1000))}
+
+        s_type = ['', 'characters', 'namecards'][index % 3]
+        if s_type == 'characters':
+            showcase = (s_type, random_gen.sample(avatars, random_gen.randint(0, 8)))
+        elif s_type == 'namecards':
+            showcase = (s_type, random_gen.sample(namecard_icons, random_gen.randint(0, 9)))
+        else:
+            showcase = (s_type, [])
+
+        # Half of the cards use the most dominant colour of their icon, and a quarter are scaled down.
+        bg_colour = '#' if index % 2 == 0 else '#9C8C72'
+        size = 0.5 if index % 4 == 3 else 1
+
+        corpus.append((user_info, random_gen.choice(avatars), random_gen.choice(namecard_images), showcase,
+                       bg_colour, size))
+
+    return corpus
+
+
+# Gets a percentile of a sorted list of values.
+def get_percentile(values, percentile):
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+# Gets the mean and percentiles of a list of durations, in milliseconds.
+def summarise(durations):
+    durations = sorted(durations)
+    return {'mean': sum(durations) / len(durations) * 1000,
+            'p50': get_percentile(durations, 50) * 1000,
+            'p95': get_percentile(durations, 95) * 1000,
+            'p99': get_percentile(durations, 99) * 1000}
+
+
+# Renders every card in the corpus the given number of times and measures the time spent in each stage.
+def run(corpus, iterations, fmt='png', warmup=True):
+    # The first pass fills the caches, so that the results reflect a warm worker.
+    if warmup:
+        for render_args in corpus:
+            cards.render_card(render_args, fmt)
+
+    latencies = []
+    stages = {}
+    cpu_start = time.process_time()
+    for empty_var in range(0, iterations):
+        for render_args in corpus:
+            timer = StageTimer()
+            start = time.perf_counter()
+            cards.render_card(render_args, fmt, timer)
+            latencies.append(time.perf_counter() - start)
+
+            for stage, duration in timer.stages.items():
+                stages.setdefault(stage, []).append(duration)
+    cpu_time = time.process_time() - cpu_start
+
+    return {'cards': len(latencies),
+            'latency': summarise(latencies),
+            'throughput_per_core': len(latencies) / cpu_time,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'stages': {stage: summarise(durations) for stage, durations in stages.items()}}
+
+
+# Compares results against a baseline, returning every metric that is slower by more than the tolerance.
+def get_regressions(results, baseline, tolerance):
+    metrics = [(f"latency {name}", results['latency'][name], baseline['latency'][name])
+               for name in ['p50', 'p95', 'p99']]
+    metrics += [(f"stage {stage}", results['stages'][stage]['mean'], baseline['stages'][stage]['mean'])
+                for stage in baseline['stages'] if stage in results['stages']]
+
+    regressions = []
+    for name, value, baseline_value in metrics:
+        # Differences of under 0.1ms are ignored, as they are within the noise of a single run.
+        if value > baseline_value * (1 + tolerance) and value - baseline_value > 0.1:
+            regressions.append(f"{name}: {baseline_value:.2f}ms -> {value:.2f}ms")
+
+    return regressions
+
+
+# Prints a summary of the results.
+def print_results(results):
+    latency = results['latency']
+    print(f"{results['cards']} cards: p50 {latency['p50']:.2f}ms, p95 {latency['p95']:.2f}ms, "
+          f"p99 {latency['p99']:.2f}ms, {results['throughput_per_core']:.1f} cards/s per core, "
+          f"peak RSS {results['peak_rss_mb']:.0f}MB")
+    for stage, durations in results['stages'].items():
+        print(f"  {stage:<10} mean {durations['mean']:.2f}ms, p95 {durations['p95']:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks profile card rendering without any network access.")
+    parser.add_argument("--cards", type=int, default=60, help="the number of cards in the corpus")
+    parser.add_argument("--iterations", type=int, default=3, help="how many times the corpus is rendered")
+    parser.add_argument("--format", default="png", help="the output format of the cards")
+    parser.add_argument("--output", help="writes the results to a JSON baseline")
+    parser.add_argument("--check", help="compares the results against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="the allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    results = run(get_corpus(args.cards), args.iterations, args.format)
+    print_results(results)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+    if args.check is not None:
+        with open(args.check, "r") as file:
+            regressions = get_regressions(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression in {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import time
+from app.api import encoding, profiles
+from benchmarks.cards import get_corpus, summarise
+
+# Run from the web_app folder, e.g.
+# python -m benchmarks.encoding --cards 6 --iterations 3
+
+
+# The encoder settings that are compared, as (format, policy) pairs.
+variants = [('png', {'compress_level': 1}),
+            ('png', {'compress_level': 3}),
+            ('png', {'compress_level': 6}),
+            ('png', {'compress_level': 9}),
+            ('png8', {'colors': 256, 'compress_level': 6}),
+            ('webp', {'lossless': True, 'quality': 0, 'method': 0}),
+            ('webp', {'lossless': False, 'quality': 80, 'method': 4}),
+            ('webp', {'lossless': False, 'quality': 90, 'method': 0}),
+            ('webp', {'lossless': False, 'quality': 90, 'method': 4}),
+            ('webp', {'lossless': False, 'quality': 90, 'method': 6}),
+            ('avif', {'quality': 75, 'speed': 8}),
+            ('avif', {'quality': 70, 'speed': 10})]
+
+
+# Encodes every image with every supported variant, measuring the time taken and the size of the output.
+def run(images, iterations):
+    results = []
+    for fmt, policy in variants:
+        if not encoding.is_supported(fmt):
+            continue
+
+        default_policy = dict(encoding.policies[fmt])
+        encoding.policies[fmt].update(policy)
+        durations = []
+        sizes = []
+        try:
+            for empty_var in range(0, iterations):
+                for image in images:
+                    start = time.perf_counter()
+                    data = encoding.encode(image, fmt)
+                    durations.append(time.perf_counter() - start)
+                    sizes.append(len(data))
+        finally:
+            encoding.policies[fmt] = default_policy
+
+        results.append({'format': fmt, 'policy': policy, 'latency': summarise(durations),
+                        'mean_kb': sum(sizes) / len(sizes) / 1024})
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the time and size of encoding profile cards.")
+    parser.add_argument("--cards", type=int, default=6, help="the number of cards that are encoded")
+    parser.add_argument("--iterations", type=int, default=3, help="how many times each card is encoded")
+    args = parser.parse_args()
+
+    images = [profiles.generate_profile(*render_args) for render_args in get_corpus(args.cards)]
+    for result in run(images, args.iterations):
+        policy = ', '.join(f"{name}={value}" for name, value in result['policy'].items())
+        print(f"{result['format']:<5} {policy:<40} mean {result['latency']['mean']:7.2f}ms, "
+              f"p95 {result['latency']['p95']:7.2f}ms, {result['mean_kb']:7.1f}KB")
+
+
+if __name__ == '__main__':
+    main()
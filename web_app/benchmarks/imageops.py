@@ -0,0 +1,83 @@
+import argparse
+import time
+import numpy as np
+from PIL import Image
+from app.api import imageops
+from app.api.images import open_icon, open_image
+from benchmarks.cards import summarise
+
+# Run from the web_app folder, e.g.
+# python -m benchmarks.imageops --iterations 200
+
+
+# Darkens an image with a lambda, as profile cards were darkened before app/api/imageops.py.
+def scale_lambda(image):
+    return image.point(lambda colour: colour * 0.55)
+
+
+def scale_lut(image):
+    return imageops.scale(image, 0.55)
+
+
+def scale_numpy(image):
+    pixels = np.asarray(image, dtype=np.float64) * 0.55
+    return Image.fromarray(np.rint(pixels).astype(np.uint8), image.mode)
+
+
+# Flattens an image's alpha with a lambda, as drop-shadows were before app/api/imageops.py.
+def flatten_lambda(image):
+    image = image.copy()
+    image.putalpha(image.getchannel('A').point(lambda a_value: 64 if a_value > 1 else 0))
+    return image
+
+
+def flatten_lut(image):
+    image = image.copy()
+    imageops.flatten_alpha(image, 64, 1)
+    return image
+
+
+def flatten_numpy(image):
+    pixels = np.array(image)
+    pixels[:, :, 3] = np.where(pixels[:, :, 3] > 1, 64, 0)
+    return Image.fromarray(pixels, image.mode)
+
+
+# The operations that are compared, as (name, image loader, image name, implementations) tuples.
+operations = [('scale', open_icon, 'UI_NameCardPic_0_P', [scale_lambda, scale_lut, scale_numpy]),
+              ('flatten alpha', open_image, 'namecard_icon_shadow', [flatten_lambda, flatten_lut, flatten_numpy])]
+
+
+# Times every implementation of every operation, checking that they all give the same pixels.
+def run(iterations):
+    results = []
+    for operation, loader, name, implementations in operations:
+        image = loader(name)
+        expected = np.asarray(implementations[0](image))
+
+        for implementation in implementations:
+            durations = []
+            for empty_var in range(0, iterations):
+                start = time.perf_counter()
+                output = implementation(image)
+                durations.append(time.perf_counter() - start)
+
+            results.append({'operation': operation, 'implementation': implementation.__name__,
+                            'latency': summarise(durations),
+                            'identical': bool((np.asarray(output) == expected).all())})
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the pixel operations used by profile cards.")
+    parser.add_argument("--iterations", type=int, default=200, help="how many times each operation is run")
+    args = parser.parse_args()
+
+    for result in run(args.iterations):
+        print(f"{result['operation']:<14} {result['implementation']:<15} mean {result['latency']['mean']:7.3f}ms, "
+              f"p95 {result['latency']['p95']:7.3f}ms, identical: {result['identical']}")
+
+
+if __name__ == '__main__':
+    main()
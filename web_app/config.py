@@ -0,0 +1,101 @@
+import json
+import os
+
+
+class Config(object):
+    # The maximum number of bytes of decoded images that are kept in memory by each worker.
+    IMAGE_CACHE_BYTES = int(os.environ.get('IMAGE_CACHE_BYTES') or 128 * 1024 * 1024)
+    # Whether the atlas of decoded images built by assets.py is mapped and shared by all workers ('mmap' or 'none'), and
+    # its path. If it has not been built, every worker decodes the images itself.
+    IMAGE_STORE = os.environ.get('IMAGE_STORE') or 'mmap'
+    IMAGE_STORE_PATH = os.environ.get('IMAGE_STORE_PATH') or './app/api/assets/atlas/images.atlas'
+    # The maximum number of bytes of profile card base layers, shared by players with the same namecard, kept in memory.
+    BASE_LAYER_CACHE_BYTES = int(os.environ.get('BASE_LAYER_CACHE_BYTES') or 64 * 1024 * 1024)
+
+    # The backend used to cache rendered profile cards: 'memory', 'disk', 'redis', 'fakeredis' or 'none'.
+    RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE') or 'memory'
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL') or 300)
+    RESPONSE_CACHE_BYTES = int(os.environ.get('RESPONSE_CACHE_BYTES') or 64 * 1024 * 1024)
+    RESPONSE_CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR') or './cache'
+    RESPONSE_CACHE_REDIS_URL = os.environ.get('RESPONSE_CACHE_REDIS_URL') or 'redis://localhost:6379/0'
+
+    # How long, in seconds, browsers and CDNs may use a profile card before revalidating it.
+    RESPONSE_MAX_AGE = int(os.environ.get('RESPONSE_MAX_AGE') or 60)
+    # How long, in seconds, the index page and error images for invalid parameters may be used before revalidating.
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE') or 86400)
+
+    # The Enka Network API endpoint for player data. This can be pointed at a local stub server for testing.
+    ENKA_URL = os.environ.get('ENKA_URL') or 'https://enka.shinshin.moe/u/{userid}/__data.json'
+    # Timeouts, in seconds, for connecting to and reading from the Enka Network API.
+    ENKA_CONNECT_TIMEOUT = float(os.environ.get('ENKA_CONNECT_TIMEOUT') or 3)
+    ENKA_READ_TIMEOUT = float(os.environ.get('ENKA_READ_TIMEOUT') or 10)
+    # How many times a failed call is retried, and the backoff, in seconds, between the retries.
+    ENKA_RETRIES = int(os.environ.get('ENKA_RETRIES') or 2)
+    ENKA_BACKOFF = float(os.environ.get('ENKA_BACKOFF') or 0.5)
+    ENKA_MAX_BACKOFF = float(os.environ.get('ENKA_MAX_BACKOFF') or 4)
+    # The number of keep-alive connections each worker keeps to the Enka Network API.
+    ENKA_POOL_SIZE = int(os.environ.get('ENKA_POOL_SIZE') or 10)
+
+    # How long, in seconds, player data is cached when the API gives no 'ttl' hint.
+    PLAYER_CACHE_TTL = int(os.environ.get('PLAYER_CACHE_TTL') or 60)
+    # How long, in seconds, expired player data may be served while it is refreshed in the background.
+    PLAYER_STALE_TTL = int(os.environ.get('PLAYER_STALE_TTL') or 600)
+    # How long, in seconds, a UserID without any player data is remembered.
+    PLAYER_MISSING_TTL = int(os.environ.get('PLAYER_MISSING_TTL') or 30)
+    # How long, in seconds, to wait before fetching a UserID again after the API could not be reached.
+    PLAYER_RETRY_INTERVAL = int(os.environ.get('PLAYER_RETRY_INTERVAL') or 10)
+
+    # The sizes cards are drawn at, e.g. '1,0.75,0.5,0.25', or 'none' to draw every card at its requested size.
+    SIZE_TIERS = [float(size) for size in (os.environ.get('SIZE_TIERS') or '1,0.75,0.5,0.25').split(',')
+                  if size != 'none']
+    # Whether other sizes are drawn at the next larger tier and resized ('derive') or served at that tier ('snap').
+    SIZE_MODE = os.environ.get('SIZE_MODE') or 'derive'
+    # Whether every smaller tier is rendered and cached in the background after a full size card ('on' or 'off').
+    SIZE_LADDER = (os.environ.get('SIZE_LADDER') or 'off') == 'on'
+
+    # The number of renderer processes used by the ASGI entry point, and how many cards may be queued for them.
+    RENDER_PROCESSES = int(os.environ.get('RENDER_PROCESSES') or os.cpu_count() or 1)
+    RENDER_QUEUE_DEPTH = int(os.environ.get('RENDER_QUEUE_DEPTH') or RENDER_PROCESSES * 4)
+
+    # Token bucket limits, in requests a second and the most requests in a burst, for /genshin requests from each client
+    # IP and for cards rendered for each UserID. A rate of 0 turns the limit off.
+    # The IP limit is off by default, as every request comes from the same IP behind a proxy unless PROXY_COUNT is set.
+    ADMISSION_IP_RATE = float(os.environ.get('ADMISSION_IP_RATE') or 0)
+    ADMISSION_IP_BURST = int(os.environ.get('ADMISSION_IP_BURST') or 20)
+    ADMISSION_UID_RATE = float(os.environ.get('ADMISSION_UID_RATE') or 1)
+    ADMISSION_UID_BURST = int(os.environ.get('ADMISSION_UID_BURST') or 5)
+    # The most cards each worker renders at once for /genshin, or 0 for no limit.
+    ADMISSION_MAX_RENDERS = int(os.environ.get('ADMISSION_MAX_RENDERS') or (os.cpu_count() or 1) * 2)
+    # Where the token buckets are kept: 'memory' for each worker, 'redis' to share them between nodes, or 'fakeredis' to
+    # run the Redis store's logic in the worker, e.g. for testing.
+    ADMISSION_STORE = os.environ.get('ADMISSION_STORE') or 'memory'
+    ADMISSION_REDIS_URL = os.environ.get('ADMISSION_REDIS_URL') or RESPONSE_CACHE_REDIS_URL
+    # The number of trusted proxies in front of the server, e.g. 1 for nginx, whose X-Forwarded-For headers are used to
+    # find each client's IP. This must not be more than the number of proxies, or clients can choose their own IP.
+    PROXY_COUNT = int(os.environ.get('PROXY_COUNT') or 0)
+
+    # Whether the most requested cards are re-rendered in the background before they expire ('on' or 'off'), how many
+    # of them, how often in seconds, and how many processes render them.
+    WARMER = (os.environ.get('WARMER') or 'off') == 'on'
+    WARMER_TOP = int(os.environ.get('WARMER_TOP') or 100)
+    WARMER_INTERVAL = int(os.environ.get('WARMER_INTERVAL') or 60)
+    WARMER_PROCESSES = int(os.environ.get('WARMER_PROCESSES') or 1)
+    # An access log whose /genshin requests are counted when the warmer starts, e.g. the log from before a deploy.
+    WARMER_REPLAY_LOG = os.environ.get('WARMER_REPLAY_LOG') or None
+
+    # Whether /api/batch can be used ('on' or 'off'), and the bearer token that every batch request must be sent with.
+    BATCH_API = (os.environ.get('BATCH_API') or 'off') == 'on'
+    BATCH_TOKEN = os.environ.get('BATCH_TOKEN') or None
+    # The most UserIDs a single /api/batch request may render, and the processes and fetch threads it uses.
+    BATCH_MAX_USERIDS = int(os.environ.get('BATCH_MAX_USERIDS') or 5000)
+    BATCH_PROCESSES = int(os.environ.get('BATCH_PROCESSES') or os.cpu_count() or 1)
+    BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY') or 8)
+
+    # Whether request stages are timed for /api/metrics ('on' or 'off'), and whether they are sent as Server-Timing.
+    METRICS = (os.environ.get('METRICS') or 'on') == 'on'
+    SERVER_TIMING = (os.environ.get('SERVER_TIMING') or 'off') == 'on'
+
+    # Encoder settings that override the defaults in app/api/encoding.py as JSON, e.g. '{"webp": {"quality": 80}}'.
+    ENCODING_POLICY = json.loads(os.environ.get('ENCODING_POLICY') or '{}')
+    # The formats that may be picked from the Accept header when no format is requested, in order of preference.
+    NEGOTIATED_FORMATS = (os.environ.get('NEGOTIATED_FORMATS') or 'webp').split(',')
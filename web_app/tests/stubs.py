@@ -0,0 +1,78 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# An HTTP server on a background thread that stands in for an upstream service, e.g. the Enka Network API, in tests.
+# routes -> {path: (status, headers, body)}, or {path: function(request headers) -> (status, headers, body)} for
+# responses that depend on the request. Any other path is answered with a 404.
+# Every request is recorded in 'requests' as (path, request headers).
+class StubServer:
+    def __init__(self, routes=None):
+        self.routes = routes if routes is not None else {}
+        self.requests = []
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append((self.path, dict(self.headers)))
+                route = stub.routes.get(self.path, (404, {}, b''))
+                status, headers, body = route(self.headers) if callable(route) else route
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    # Gets the URL of a path on the server.
+    def url(self, path):
+        return f"http://127.0.0.1:{self._server.server_port}{path}"
+
+    # Gets the paths of every request so far.
+    def paths(self):
+        return [path for path, headers in self.requests]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+# A clock that only moves when it is told to, for classes that take a 'clock' time source.
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+# Waits for a condition that is met by a background thread, failing the test if it takes too long.
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting for a background thread."
+        time.sleep(0.01)
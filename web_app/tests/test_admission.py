@@ -0,0 +1,170 @@
+import threading
+import pytest
+from app import app
+from app.api.admission import AdmissionControl, AdmissionError, Coalescer, MemoryBuckets, RedisBuckets, admission
+from app.api.cache import FakeRedis
+from app.api.players import player_cache
+from tests.stubs import FakeClock, wait_until
+
+# Run from the web_app folder, e.g.
+# python -m pytest tests
+
+user_data = {'nickname': "Traveler", 'signature': "", 'level': 55, 'nameCardId': 210001,
+             'profilePicture': {'avatarId': 10000002}, 'showAvatarInfoList': [{'avatarId': 10000002}],
+             'worldLevel': 8, 'finishAchievementNum': 500, 'towerFloorIndex': 12, 'towerLevelIndex': 3}
+
+
+# Both stores are tested with the same clock, the Redis one through the FakeRedis's Python equivalent of its script.
+@pytest.fixture(params=['memory', 'fakeredis'])
+def buckets(request):
+    clock = FakeClock()
+    if request.param == 'memory':
+        return MemoryBuckets(clock), clock
+    return RedisBuckets(FakeRedis(), clock=clock), clock
+
+
+def test_burst_and_refill(buckets):
+    buckets, clock = buckets
+
+    # A bucket of 3 tokens refilled at 2 a second.
+    assert [buckets.take('ip:1', 2, 3) for empty_var in range(0, 3)] == [0, 0, 0]
+    assert buckets.take('ip:1', 2, 3) == pytest.approx(0.5)
+
+    clock.advance(0.5)
+    assert buckets.take('ip:1', 2, 3) == 0
+    assert buckets.take('ip:1', 2, 3) == pytest.approx(0.5)
+
+    # Refilling never goes over the burst.
+    clock.advance(60)
+    assert [buckets.take('ip:1', 2, 3) for empty_var in range(0, 3)] == [0, 0, 0]
+    assert buckets.take('ip:1', 2, 3) > 0
+
+
+def test_buckets_are_separate(buckets):
+    buckets, clock = buckets
+
+    assert buckets.take('ip:1', 1, 1) == 0
+    assert buckets.take('ip:1', 1, 1) > 0
+    assert buckets.take('ip:2', 1, 1) == 0
+
+
+def test_uid_limit():
+    control = AdmissionControl(MemoryBuckets(FakeClock()), uid_rate=1, uid_burst=1)
+
+    assert control.render('123456789', 'a', lambda: 'card') == ('card', False)
+    with pytest.raises(AdmissionError) as error:
+        control.render('123456789', 'b', lambda: 'card')
+    assert (error.value.status, error.value.retry_after) == (429, 1)
+    assert control.render('987654321', 'c', lambda: 'card') == ('card', False)
+    assert control.limited == 1
+
+
+def test_render_cap():
+    control = AdmissionControl(max_renders=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def render():
+        started.set()
+        assert release.wait(5)
+        return 'card'
+
+    thread = threading.Thread(target=control.render, args=('123456789', 'a', render))
+    thread.start()
+    assert started.wait(5)
+
+    # A different card cannot be rendered while every slot is in use, and background work cannot take a slot either.
+    with pytest.raises(AdmissionError) as error:
+        control.render('987654321', 'b', lambda: 'card')
+    assert (error.value.status, error.value.retry_after) == (503, 1)
+    assert not control.acquire()
+
+    release.set()
+    thread.join()
+    assert control.in_flight == 0
+    assert control.render('987654321', 'b', lambda: 'card') == ('card', False)
+    assert control.overloaded == 1
+
+
+# Runs a leader and followers for the same key, releasing the leader once every follower is waiting for it.
+# Returns the leader's and followers' outcomes as ('result', (value, coalesced)) or ('error', exception).
+def run_coalesced(function, followers=4):
+    coalescer = Coalescer()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def leader_function():
+        calls.append(None)
+        started.set()
+        assert release.wait(5)
+        return function()
+
+    outcomes = []
+
+    def run():
+        try:
+            outcomes.append(('result', coalescer.run('key', leader_function)))
+        except Exception as error:
+            outcomes.append(('error', error))
+
+    threads = [threading.Thread(target=run)]
+    threads[0].start()
+    assert started.wait(5)
+    threads += [threading.Thread(target=run) for empty_var in range(0, followers)]
+    for thread in threads[1:]:
+        thread.start()
+
+    wait_until(lambda: coalescer.coalesced == followers)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    return outcomes
+
+
+def test_followers_share_result():
+    card = object()
+    outcomes = run_coalesced(lambda: card)
+
+    assert sorted(coalesced for kind, (value, coalesced) in outcomes) == [False, True, True, True, True]
+    assert all(value is card for kind, (value, coalesced) in outcomes)
+
+
+def test_followers_share_exception():
+    failure = ValueError("render failed")
+
+    def fail():
+        raise failure
+
+    outcomes = run_coalesced(fail)
+    assert outcomes == [('error', failure)] * 5
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(player_cache, 'get', lambda userid: dict(user_data))
+    monkeypatch.setattr(admission, 'buckets', MemoryBuckets(FakeClock()))
+    monkeypatch.setattr(admission, 'ip_rate', 0)
+    monkeypatch.setattr(admission, 'uid_rate', 0)
+    return app.test_client()
+
+
+def test_ip_limit_response(client, monkeypatch):
+    monkeypatch.setattr(admission, 'ip_rate', 0.5)
+    monkeypatch.setattr(admission, 'ip_burst', 1)
+
+    assert client.get('/genshin?userid=12345').status_code == 200
+    response = client.get('/genshin?userid=12345')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '2'
+
+
+def test_render_cap_response(client, monkeypatch):
+    monkeypatch.setattr(admission, 'max_renders', 1)
+    monkeypatch.setattr(admission, 'in_flight', 1)
+
+    response = client.get('/genshin?userid=100000001')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
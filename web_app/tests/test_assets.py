@@ -0,0 +1,123 @@
+import json
+import os
+from io import BytesIO
+import pytest
+from PIL import Image
+from app.api import assets
+from tests.stubs import StubServer
+
+# Run from the web_app folder, e.g.
+# python -m pytest tests
+
+last_modified = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+def encode_png(colour):
+    image_out = BytesIO()
+    Image.new('RGBA', (16, 16), colour).save(image_out, 'PNG')
+    return image_out.getvalue()
+
+
+# Answers with a file and its ETag, or a 304 if the request already has that ETag.
+def conditional(body, etag):
+    def respond(headers):
+        if headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+        return 200, {'ETag': etag, 'Last-Modified': last_modified}, body
+    return respond
+
+
+# Synchronises into an empty assets folder instead of the application's.
+@pytest.fixture
+def assets_path(tmp_path, monkeypatch):
+    for file_type in ['images', 'json']:
+        os.makedirs(tmp_path / file_type)
+    monkeypatch.setattr(assets, 'assets_path', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def server():
+    png = encode_png('red')
+    routes = {'/ui/Good.png': conditional(png, '"good-1"'),
+              '/ui/Truncated.png': (200, {'ETag': '"truncated-1"'}, png[:len(png) // 2]),
+              '/ui/Text.png': (200, {}, b'Not a PNG'),
+              '/json/Data.json': conditional(json.dumps([{'id': 1}, {'id': 2}]).encode('utf-8'), '"data-1"')}
+    with StubServer(routes) as server:
+        yield server
+
+
+def sync(server, manifest, paths):
+    files = [('images' if path.endswith('.png') else 'json', server.url(path)) for path in paths]
+    assets.sync_files(assets.create_session(), manifest, files)
+
+
+def test_files_are_downloaded_and_recorded(assets_path, server):
+    manifest = {}
+    sync(server, manifest, ['/ui/Good.png', '/json/Data.json'])
+
+    with Image.open(assets_path / 'images' / 'Good.png') as image:
+        assert image.size == (16, 16)
+    assert list(assets.iter_json_array(str(assets_path / 'json' / 'Data.json'))) == [{'id': 1}, {'id': 2}]
+    assert manifest == {'images/Good.png': {'etag': '"good-1"', 'last_modified': last_modified},
+                        'json/Data.json': {'etag': '"data-1"', 'last_modified': last_modified}}
+    assert sorted(os.listdir(assets_path / 'images')) == ['Good.png']
+
+
+@pytest.mark.parametrize('path', ['/ui/Truncated.png', '/ui/Text.png'])
+def test_broken_images_are_not_written(assets_path, server, path):
+    manifest = {}
+    sync(server, manifest, [path])
+
+    assert os.listdir(assets_path / 'images') == []
+    assert manifest == {}
+
+
+def test_broken_image_keeps_existing_file(assets_path, server):
+    existing = encode_png('blue')
+    (assets_path / 'images' / 'Truncated.png').write_bytes(existing)
+    manifest = {'images/Truncated.png': {'etag': '"truncated-0"', 'last_modified': None}}
+    sync(server, manifest, ['/ui/Truncated.png'])
+
+    assert (assets_path / 'images' / 'Truncated.png').read_bytes() == existing
+    assert os.listdir(assets_path / 'images') == ['Truncated.png']
+    assert manifest == {'images/Truncated.png': {'etag': '"truncated-0"', 'last_modified': None}}
+
+
+def test_missing_file_is_not_written(assets_path, server):
+    manifest = {}
+    sync(server, manifest, ['/ui/Missing.png'])
+
+    assert server.paths() == ['/ui/Missing.png']
+    assert os.listdir(assets_path / 'images') == []
+    assert manifest == {}
+
+
+def test_second_sync_is_conditional(assets_path, server):
+    manifest = {}
+    sync(server, manifest, ['/ui/Good.png', '/json/Data.json'])
+    first_manifest = json.loads(json.dumps(manifest))
+    stats = {name: os.stat(assets_path / name).st_mtime_ns for name in ['images/Good.png', 'json/Data.json']}
+
+    server.requests.clear()
+    sync(server, manifest, ['/ui/Good.png', '/json/Data.json'])
+
+    # Both files are asked for with their validators, answered with a 304, and left untouched.
+    headers = dict(server.requests)
+    assert headers['/ui/Good.png']['If-None-Match'] == '"good-1"'
+    assert headers['/ui/Good.png']['If-Modified-Since'] == last_modified
+    assert headers['/json/Data.json']['If-None-Match'] == '"data-1"'
+    assert manifest == first_manifest
+    assert {name: os.stat(assets_path / name).st_mtime_ns for name in stats} == stats
+    assert sorted(os.listdir(assets_path / 'images')) == ['Good.png']
+
+
+def test_image_downloads_skip_unchanged_images(assets_path):
+    (assets_path / 'images' / 'Kept.png').write_bytes(encode_png('green'))
+    (assets_path / 'images' / 'Broken.png').write_bytes(encode_png('green')[:20])
+    manifest = {}
+
+    downloads = assets.get_image_downloads({'Kept', 'Broken', 'New'}, manifest)
+
+    assert [url.split('/')[-1] for file_type, url in downloads] == ['Broken.png', 'New.png']
+    assert manifest == {'images/Kept.png': {'etag': None, 'last_modified': None}}
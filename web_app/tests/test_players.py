@@ -0,0 +1,148 @@
+import copy
+import json
+import threading
+from app.api.enka import EnkaClient
+from app.api.players import PlayerCache
+from tests.stubs import FakeClock, StubServer, wait_until
+
+# Run from the web_app folder, e.g.
+# python -m pytest tests
+
+
+# A stand-in for the EnkaClient that counts its calls and can hold them until it is released.
+# user_data -> what get_player() returns, where None is a call that failed.
+class StubClient:
+    def __init__(self, user_data):
+        self.user_data = user_data
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def get_player(self, userid):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        return copy.deepcopy(self.user_data)
+
+
+def player(level):
+    return {'playerInfo': {'nickname': "Traveler", 'level': level}}
+
+
+# Waits for the cache to finish any fetches running in the background.
+def wait_for_fetches(cache):
+    wait_until(lambda: cache.stats()['fetches'] == 0)
+
+
+def test_upstream_ttl_is_used():
+    routes = {'/u/123456789/__data.json': (200, {'Content-Type': 'application/json'},
+                                           json.dumps(dict(player(50), ttl=5)).encode('utf-8'))}
+    with StubServer(routes) as server:
+        clock = FakeClock()
+        client = EnkaClient(url=server.url('/u/{userid}/__data.json'), retries=0)
+        cache = PlayerCache(default_ttl=60, client=client, clock=clock)
+
+        assert cache.get('123456789') == {'nickname': "Traveler", 'level': 50}
+        clock.advance(4)
+        assert cache.get('123456789')['level'] == 50
+        assert len(server.requests) == 1
+
+        # Once the API's ttl has passed, and well before default_ttl, the data is refreshed.
+        clock.advance(2)
+        assert cache.get('123456789')['level'] == 50
+        wait_until(lambda: len(server.requests) == 2)
+        wait_for_fetches(cache)
+        assert cache.stats()['stale_hits'] == 1
+
+
+def test_stub_server_answers():
+    routes = {'/u/1/__data.json': (404, {'Content-Type': 'text/html'}, b'Not found'),
+              '/u/2/__data.json': (500, {'Content-Type': 'text/html'}, b'Error')}
+    with StubServer(routes) as server:
+        client = EnkaClient(url=server.url('/u/{userid}/__data.json'), retries=1, backoff=0)
+
+        # A player without any data is an empty dictionary, while a failed call is None after its retries.
+        assert client.get_player('1') == {}
+        assert client.get_player('2') is None
+        assert server.paths().count('/u/2/__data.json') == 2
+
+
+def test_concurrent_misses_share_one_fetch():
+    client = StubClient(player(50))
+    client.release.clear()
+    cache = PlayerCache(client=client)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('123456789'))) for empty_var in range(0, 8)]
+    for thread in threads:
+        thread.start()
+
+    # Every request has missed the cache before the fetch is allowed to finish.
+    wait_until(lambda: cache.stats()['misses'] == 8)
+    client.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert client.calls == 1
+    assert results == [{'nickname': "Traveler", 'level': 50}] * 8
+
+
+def test_stale_data_is_served_during_refresh():
+    clock = FakeClock()
+    client = StubClient(player(50))
+    cache = PlayerCache(default_ttl=60, stale_ttl=600, client=client, clock=clock)
+    cache.get('123456789')
+
+    clock.advance(61)
+    client.user_data = player(51)
+    client.started.clear()
+    client.release.clear()
+
+    # The stale data is returned while the refresh is still waiting on the API.
+    assert cache.get('123456789')['level'] == 50
+    assert client.started.wait(5)
+    assert cache.get('123456789')['level'] == 50
+    assert client.calls == 2
+
+    client.release.set()
+    wait_for_fetches(cache)
+    assert cache.get('123456789')['level'] == 51
+    assert client.calls == 2
+
+
+def test_failed_refresh_keeps_stale_data():
+    clock = FakeClock()
+    client = StubClient(player(50))
+    cache = PlayerCache(default_ttl=60, retry_interval=10, client=client, clock=clock)
+    cache.get('123456789')
+
+    clock.advance(61)
+    client.user_data = None
+    assert cache.get('123456789')['level'] == 50
+    wait_for_fetches(cache)
+
+    # The failed fetch is not retried until retry_interval has passed, and the old data is served meanwhile.
+    clock.advance(5)
+    assert cache.get('123456789')['level'] == 50
+    assert client.calls == 2
+
+    clock.advance(6)
+    assert cache.get('123456789')['level'] == 50
+    wait_for_fetches(cache)
+    assert client.calls == 3
+
+
+def test_failed_fetch_is_not_remembered_as_missing():
+    clock = FakeClock()
+    client = StubClient(None)
+    cache = PlayerCache(retry_interval=10, client=client, clock=clock)
+
+    assert cache.get('123456789') is None
+    assert cache.get('123456789') is None
+    assert client.calls == 1
+
+    clock.advance(11)
+    client.user_data = player(50)
+    assert cache.get('123456789')['level'] == 50
+    assert client.calls == 2